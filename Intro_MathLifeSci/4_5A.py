@@ -17,27 +17,46 @@ import os
 from PIL import Image
 import time
 import discreteLaplacian
+import reactionDiffusion
+import gridRecorder
 
 #init.
-Xmax, Tmax = 100, 500
+Xmax, Tmax = 100, 2000  #Tmax is an upper bound; B settles by T = 690
 dt, dx = 0.1, 1.
 d, k = 1., 0.1
 dx2 = dx*dx
+tol, CHECK = 1e-4, 10   #stop once max|dB/dt| < tol, checked every CHECK steps
+STEP = 2    #keep every STEP-th time step for the animation
 
-B = np.zeros((Xmax, Xmax, Tmax))
 c = np.zeros((Xmax, Xmax))
 #Initial conc. distribution of Dpp
 c[:, 47:53] = 0.5
 
 starttime = time.time() #start timing
 
-#Solve PDE
-for T in range(Tmax - 1):
-    B[:, :, T + 1] = dt * (d * discreteLaplacian.Lap2DMt(B[:, :, T], dx2) - k * B[:, :, T] + c) + B[:, :, T]
+#Reaction term of B, added to the diffusion term in place
+def reaction(U, dUdt):
+    dUdt[0] += c - k * U[0]
+
+#Solve PDE, until B has settled or Tmax
+stepper = reactionDiffusion.RDStepper((1, Xmax, Xmax), dx2, [d], reaction, dt)
+recorder = gridRecorder.MemoryRecorder()
+U, Tc, tc, residual = reactionDiffusion.run_until_steady(stepper.step, np.zeros((1, Xmax, Xmax)), Tmax, dt,
+                                                         tol, CHECK, recorder, STEP)
+if Tc is None:
+    print('Not settled by Tmax, max|dB/dt| = {}'.format(residual))
+else:
+    print('Settled at t = {} (T = {})'.format(tc, Tc))
+B = np.moveaxis(recorder.frames[:, 0], 0, -1)   #(Xmax, Xmax, number of frames)
+Tmax = B.shape[2]
 
 elapsedtime = time.time() - starttime
 print('Time elapsed (sec): {}'.format(elapsedtime))
 
+#Steady state, solved directly: (d * (Laplacian) - k) * B = -c
+Bs = discreteLaplacian.Lap2DSteadyState(c, dx2, d, k)
+print('max|B - Bs| at the last step: {}'.format(np.abs(B[:, :, Tmax - 1] - Bs).max()))
+
 #Plot results
 len_T = len(str(Tmax))  #the number of digits in Tmax
 for time in range(Tmax):
@@ -46,6 +46,11 @@ for T in range(Tmax - 1):
 elapsedtime = time.time() - starttime
 print('Time elapsed (sec): {}'.format(elapsedtime))
 
+#Steady state, solved directly: (d * (Laplacian) - k) * B = -c, S = a * B / k
+Bs = discreteLaplacian.Lap2DSteadyState(c, dx2, d, k)
+Ss = a * Bs / k
+print('max|B - Bs|, max|S - Ss| at Tmax: {}, {}'.format(np.abs(B[:, :, Tmax - 1] - Bs).max(), np.abs(S[:, :, Tmax - 1] - Ss).max()))
+
 #Plot results
 len_T = len(str(Tmax))  #the number of digits in Tmax
 for time in range(Tmax):
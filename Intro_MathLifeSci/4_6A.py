@@ -21,16 +21,17 @@ import os
 from PIL import Image
 import time
 import discreteLaplacian
+import reactionDiffusion
+import gridRecorder
 
 #init.
-Xmax, Tmax = 100, 500
+Xmax, Tmax = 100, 3000  #Tmax is an upper bound; B, W, D settle by T = 1350
 dt, dx = 0.1, 1.
 d, k, a = 1., 0.1, 1.
 dx2 = dx*dx
+tol, CHECK = 1e-4, 10   #stop once max|dU/dt| < tol, checked every CHECK steps
+STEP = 5    #keep every STEP-th time step for the animation
 
-B = np.zeros((Xmax, Xmax, Tmax))
-W = np.zeros((Xmax, Xmax, Tmax))
-D = np.zeros((Xmax, Xmax, Tmax))
 cb = np.zeros((Xmax, Xmax))
 cw = np.zeros((Xmax, Xmax))
 
@@ -40,15 +41,35 @@ cw[0:49, 40:59] = 0.5
 
 starttime = time.time() #start timing
 
-#Solve PDEs
-for T in range(Tmax - 1):
-    B[:, :, T + 1] = dt * (d * discreteLaplacian.Lap2DMt(B[:, :, T], dx2) - k * B[:, :, T] + cb) + B[:, :, T]
-    W[:, :, T + 1] = dt * (d * discreteLaplacian.Lap2DMt(W[:, :, T], dx2) - k * W[:, :, T] + cw) + W[:, :, T]
-    D[:, :, T + 1] = dt * (a * B[:, :, T] * W[:, :, T] - k * D[:, :, T]) + D[:, :, T]
+#Reaction terms of B, W, D, added to the diffusion terms in place
+def reaction(U, dUdt):
+    dUdt[0] += cb - k * U[0]
+    dUdt[1] += cw - k * U[1]
+    dUdt[2] += a * U[0] * U[1] - k * U[2]
+
+#B, W, D stacked in one array; D does not diffuse
+U = np.zeros((3, Xmax, Xmax))
+stepper = reactionDiffusion.RDStepper(U.shape, dx2, [d, d, 0.], reaction, dt)
+
+#Solve PDEs, until B, W, D have settled or Tmax
+recorder = gridRecorder.MemoryRecorder()
+U, Tc, tc, residual = reactionDiffusion.run_until_steady(stepper.step, U, Tmax, dt, tol, CHECK, recorder, STEP)
+if Tc is None:
+    print('Not settled by Tmax, max|dU/dt| = {}'.format(residual))
+else:
+    print('Settled at t = {} (T = {})'.format(tc, Tc))
+B, W, D = np.moveaxis(recorder.frames, 0, -1)   #(Xmax, Xmax, number of frames) each
+Tmax = B.shape[2]
 
 elapsedtime = time.time() - starttime
 print('Time elapsed (sec): {}'.format(elapsedtime))
 
+#Steady state, solved directly: (d * (Laplacian) - k) * B = -cb, likewise W, D = a * B * W / k
+Bs = discreteLaplacian.Lap2DSteadyState(cb, dx2, d, k)
+Ws = discreteLaplacian.Lap2DSteadyState(cw, dx2, d, k)
+Ds = a * Bs * Ws / k
+print('max|D - Ds| at the last step: {}'.format(np.abs(D[:, :, Tmax - 1] - Ds).max()))
+
 #Plot results
 len_T = len(str(Tmax))  #the number of digits in Tmax
 for time in range(Tmax):
@@ -21,7 +21,7 @@ import matplotlib.pyplot as plt
 import os
 from PIL import Image
 import time
-import discreteLaplacian
+import fastKernels
 
 #init.
 Xmax, Tmax = 100, 5001
@@ -43,16 +43,10 @@ A[45:55,25:35,0], A[75:80,65:70,0], A[25:30,85:90,0] = 1., 1., 1.
 starttime = time.time() #start timing
 
 #Solve PDEs
+#Ap, Ip are clipped to [0, Apmax], [0, Ipmax] inside the stepper
+stepper = fastKernels.ClippedTuringStepper((Xmax, Xmax), dx2, da, di, ka, ki, c1, c2, c3, c4, c5, c6, Apmax, Ipmax, dt)
 for T in range(Tmax - 1):
-    #Define Ap and Ip
-    Ap = c1 * A[:, :, T] + c2 * I[:, :, T] + c3
-    Ip = c4 * A[:, :, T] + c5 * I[:, :, T] + c6
-    #Apply maximum and minimum values
-    Ap = Ap.clip(0., Apmax)
-    Ip = Ip.clip(0., Ipmax)
-    #Solve PDEs
-    A[:, :, T + 1] = dt * (da * discreteLaplacian.Lap2DMt(A[:, :, T], dx2) - ka * A[:, :, T] + Ap) + A[:, :, T]
-    I[:, :, T + 1] = dt * (di * discreteLaplacian.Lap2DMt(I[:, :, T], dx2) - ki * I[:, :, T] + Ip) + I[:, :, T]
+    stepper.step(A[:, :, T], I[:, :, T], A[:, :, T + 1], I[:, :, T + 1])
 
 
 elapsedtime = time.time() - starttime
@@ -17,7 +17,9 @@ d -- diffusion coefficient
 
 import numpy as np
 import matplotlib.pyplot as plt
-import discreteLaplacian
+import fastKernels
+import gridRecorder
+import reactionDiffusion
 import os
 from PIL import Image
 
@@ -25,29 +27,36 @@ from PIL import Image
 Tmax, dt = 5000, 0.02
 Xmax, dx = 100, 1.
 dx2 = dx*dx
-V = np.zeros((Xmax, Xmax, Tmax))
-W = np.zeros((Xmax, Xmax, Tmax))
+VW = np.zeros((2, Xmax, Xmax))    #V, W at the current time step
 I = np.zeros((Xmax, Xmax))
 I[49:51, 49:51] = 1.
 d, a, b, c = 1., 0.7, 0.8, 10.
 
 #Solve ODEs
-for T in range(Tmax-1):
-    V[:, :, T + 1] = V[:, :, T] + dt * (c * (-V[:, :, T]**3 / 3. + V[:, :, T] - W[:, :, T] + I) + d * discreteLaplacian.Lap2DMt(V[:, :, T], dx2))
-    W[:, :, T + 1] = W[:, :, T] + dt * (V[:, :, T] - b * W[:, :, T] + a) / c
+#SUBSTEPS > 1 (a divisor of STEP, e.g. 20): multirate, W is stepped once per SUBSTEPS steps of V
+SUBSTEPS = 1
+if SUBSTEPS > 1:
+    stepper = fastKernels.MultirateFHNStepper((Xmax, Xmax), dx2, d, a, b, c, I, dt, SUBSTEPS)
+else:
+    stepper = fastKernels.FHNStepper((Xmax, Xmax), dx2, d, a, b, c, I, dt)
 
-#Reduce size of matrices by slicing
+#Advance stacked V, W into VW_next
+def step(VW, VW_next):
+    stepper.step(VW[0], VW[1], VW_next[0], VW_next[1])
+
+#Keep every STEP-th time step only
 STEP = 100
-Vr = V[:, :, ::STEP]
-Wr = W[:, :, ::STEP]
+recorder = gridRecorder.MemoryRecorder()
+reactionDiffusion.run_streaming(step, VW, Tmax // SUBSTEPS, dt * SUBSTEPS, recorder, STEP // SUBSTEPS)
+Vr, Wr = np.moveaxis(recorder.frames, 0, -1)    #(Xmax, Xmax, Tmax / STEP) each
 
 #Plot results
 len_T = len(str(Vr.shape[2]))  #the number of digits
 for time in range(Vr.shape[2]):
     fig, axs = plt.subplots(1, 2, figsize=(6.4, 2.4))
-    heatmapV = axs[0].pcolor(Vr[:, :, time], vmin=0.0, vmax=np.ceil(V.max()), cmap='YlOrRd')
+    heatmapV = axs[0].pcolor(Vr[:, :, time], vmin=0.0, vmax=np.ceil(Vr.max()), cmap='YlOrRd')
     fig.colorbar(heatmapV, ax=axs[0])
-    heatmapW = axs[1].pcolor(Wr[:, :, time], vmin=0.0, vmax=np.ceil(W.max()), cmap='YlOrRd')
+    heatmapW = axs[1].pcolor(Wr[:, :, time], vmin=0.0, vmax=np.ceil(Wr.max()), cmap='YlOrRd')
     fig.colorbar(heatmapW, ax=axs[1])
     s = str(time).zfill(len_T)
     fig.tight_layout()
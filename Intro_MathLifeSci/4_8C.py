@@ -17,7 +17,9 @@ d -- diffusion coefficient
 
 import numpy as np
 import matplotlib.pyplot as plt
-import discreteLaplacian
+import fastKernels
+import gridRecorder
+import reactionDiffusion
 import os
 from PIL import Image
 
@@ -25,8 +27,7 @@ from PIL import Image
 Tmax, dt = 5000, 0.02
 Xmax, dx = 100, 1.
 dx2 = dx*dx
-V = np.zeros((Xmax, Xmax, Tmax))
-W = np.zeros((Xmax, Xmax, Tmax))
+VW = np.zeros((2, Xmax, Xmax))    #V, W at the current time step
 I = np.zeros((Xmax, Xmax))
 I[49:51, 49:51] = 1.
 a, b, c = 0.7, 0.8, 10.
@@ -34,22 +35,32 @@ d = np.ones((100, 100))
 d[40:50, 40:80] = 0.
 
 #Solve ODEs
-for T in range(Tmax-1):
-    V[:, :, T + 1] = V[:, :, T] + dt * (c * (-V[:, :, T]**3 / 3. + V[:, :, T] - W[:, :, T] + I) + d * discreteLaplacian.Lap2DMt(V[:, :, T], dx2))
-    W[:, :, T + 1] = W[:, :, T] + dt * (V[:, :, T] - b * W[:, :, T] + a) / c
+#Flux-conservative diffusion: no current flows into or out of the block
+stepper = fastKernels.FHNStepper((Xmax, Xmax), dx2, d, a, b, c, I, dt, conservative=True)
 
-#Reduce size of matrices by slicing
+#Advance stacked V, W into VW_next
+def step(VW, VW_next):
+    stepper.step(VW[0], VW[1], VW_next[0], VW_next[1])
+
+#Keep every STEP-th time step only, on disk: a checkpoint then only records
+#how many frames are written (a MemoryRecorder would be saved in full each time)
 STEP = 100
-Vr = V[:, :, ::STEP]
-Wr = W[:, :, ::STEP]
+#Checkpoint every 1000 steps; rerunning after an interruption resumes from it
+#(a checkpoint left by a run with other parameters is refused)
+params = {'I': I, 'd': d, 'a': a, 'b': b, 'c': c}
+with gridRecorder.DiskRecorder('4_8C_frames', ['V', 'W'], (Xmax, Xmax), params={'a': a, 'b': b, 'c': c, 'dt': dt, 'STEP': STEP}) as recorder:
+    reactionDiffusion.run_checkpointed(step, VW, Tmax, dt, '4_8C_checkpoint.npz', 1000, recorder, STEP, params=params)
+store = gridRecorder.SnapshotStore('4_8C_frames')
+Vr = np.moveaxis(store['V'][:], 0, -1)    #(Xmax, Xmax, Tmax / STEP)
+Wr = np.moveaxis(store['W'][:], 0, -1)
 
 #Plot results
 len_T = len(str(Vr.shape[2]))  #the number of digits
 for time in range(Vr.shape[2]):
     fig, axs = plt.subplots(1, 2, figsize=(6.4, 2.4))
-    heatmapV = axs[0].pcolor(Vr[:, :, time], vmin=0.0, vmax=np.ceil(V.max()), cmap='YlOrRd')
+    heatmapV = axs[0].pcolor(Vr[:, :, time], vmin=0.0, vmax=np.ceil(Vr.max()), cmap='YlOrRd')
     fig.colorbar(heatmapV, ax=axs[0])
-    heatmapW = axs[1].pcolor(Wr[:, :, time], vmin=0.0, vmax=np.ceil(W.max()), cmap='YlOrRd')
+    heatmapW = axs[1].pcolor(Wr[:, :, time], vmin=0.0, vmax=np.ceil(Wr.max()), cmap='YlOrRd')
     fig.colorbar(heatmapW, ax=axs[1])
     s = str(time).zfill(len_T)
     fig.tight_layout()
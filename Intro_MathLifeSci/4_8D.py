@@ -18,6 +18,7 @@ d -- diffusion coefficient
 import numpy as np
 import matplotlib.pyplot as plt
 import discreteLaplacian
+import reactionDiffusion
 import os
 from PIL import Image
 from scipy.integrate import odeint
@@ -33,10 +34,9 @@ def dvdt_dwdt(v, w, Ie):
 
 #Heartbeat
 def heartbeat2D(matVW, t):
-    # reshape V, W
-    n = int(len(matVW) / 2)
-    x_max = int(np.sqrt(n))
-    v1, w1 = matVW[:n].reshape(x_max, x_max), matVW[n:].reshape(x_max, x_max)
+    # reshape V, W (cell-major: V and W of each cell side by side)
+    x_max = int(np.sqrt(len(matVW) / 2))
+    v1, w1 = reactionDiffusion.from_cell_major(matVW, (2, x_max, x_max))
 
     #External curren generated in the SV node
     i = np.zeros((x_max, x_max))
@@ -44,7 +44,16 @@ def heartbeat2D(matVW, t):
 
     #PDEs
     dvdt, dwdt = dvdt_dwdt(v1, w1, i)
-    return np.hstack((dvdt.ravel(), dwdt.ravel()))
+    return reactionDiffusion.to_cell_major(np.stack((dvdt, dwdt)))
+
+#Jacobian of heartbeat2D in the band storage of odeint (see reactionDiffusion.MOLJacobian)
+def heartbeat2D_jac(matVW, t):
+    x_max = int(np.sqrt(len(matVW) / 2))
+    v1 = reactionDiffusion.from_cell_major(matVW, (2, x_max, x_max))[0]
+    b, c = 0.8, 10.
+    one = np.ones((x_max, x_max))
+    #[[dV'/dV, dV'/dW], [dW'/dV, dW'/dW]] per cell
+    return jacobian.banded(np.array([[c * (1. - v1**2), -c * one], [one / c, -b / c * one]]))
 
 #Initialize params
 Tmax, dt = 5000, 0.02
@@ -55,9 +64,12 @@ W = np.zeros((Xmax, Xmax, Tmax))
 t = np.arange(0, Tmax*dt, dt)
 
 #Solve PDEs
-VW = odeint(heartbeat2D, VW_ini, t)
-V = VW[:,:Xmax**2].T.reshape(Xmax, Xmax, Tmax)
-W = VW[:,Xmax**2:].T.reshape(Xmax, Xmax, Tmax)
+#Banded Jacobian: ml = mu = 2 * Xmax in cell-major order, so a stiff step
+#does not build a dense (2 * Xmax**2)**2 finite-difference Jacobian
+jacobian = reactionDiffusion.MOLJacobian((2, Xmax, Xmax), 1., [1., 0.])    #dx = 1, W does not diffuse
+VW = odeint(heartbeat2D, VW_ini, t, Dfun=heartbeat2D_jac, ml=jacobian.ml, mu=jacobian.mu)
+V = VW[:, 0::2].T.reshape(Xmax, Xmax, Tmax)
+W = VW[:, 1::2].T.reshape(Xmax, Xmax, Tmax)
 
 
 
@@ -21,9 +21,9 @@ ae -- production of E
 import numpy as np
 import matplotlib.pyplot as plt
 import discreteLaplacian
+import checkpoint
 import os
 from PIL import Image
-from scipy.integrate import odeint
 
 #Function that returns dA/dt, dE/dt
 def vec_dt(A, E):
@@ -55,8 +55,9 @@ A0 = np.zeros((Xmax, Xmax))
 A0[:, 0] = 0.5
 vec_ini = np.hstack((A0.ravel(), E0))
 
-#Solve PDEs
-vec_out = odeint(twovar_proneural,vec_ini, t)
+#Solve PDEs, with a checkpoint every 50 time points
+#rerunning after an interruption resumes from it
+vec_out = checkpoint.run_odeint(twovar_proneural, vec_ini, t, '4_9A_checkpoint.npz', 50)
 
 #Reshape A and E
 A = vec_out[:,:Xmax**2].T.reshape(Xmax, Xmax, Tmax)
@@ -32,9 +32,9 @@ dc -- cis-inhibition of N by D in the same cell
 import numpy as np
 import matplotlib.pyplot as plt
 import discreteLaplacian
+import checkpoint
 import os
 from PIL import Image
-from scipy.integrate import odeint
 
 #Function that returns dA/dt, dE/dt, dD/dt, dN/dt
 def vec_dt(A, E, D, N):
@@ -42,16 +42,8 @@ def vec_dt(A, E, D, N):
     de, ae, ke, ea = 1., 1., 1., 10.
     kn, dn, dc, kd, ad = 1., 0.25, 0.25, 1., 1.
 
-    #sum of D in neighboring cells
-    D_upper = np.roll(D, 1, axis=0)
-    D_upper[0,:] = 0
-    D_lower = np.roll(D, -1, axis=0)
-    D_lower[-1, :] = 0
-    D_left = np.roll(D, 1, axis=1)
-    D_left[0, :] = 0
-    D_right = np.roll(D, -1, axis=1)
-    D_right[-1, :] = 0
-    D_nei = D_upper + D_lower + D_left + D_right
+    #sum of D in neighboring cells (no cells outside the grid)
+    D_nei = discreteLaplacian.NeighbourSum(D)
 
     # Notch mutant
     Nmut = np.ones(N.shape)
@@ -90,8 +82,9 @@ A0 = np.zeros((Xmax, Xmax))
 A0[:, 0] = 0.5
 vec_ini = np.hstack((A0.ravel(), E0, D0, N0))
 
-#Solve PDEs
-vec_out = odeint(fourvar_proneural,vec_ini, t)
+#Solve PDEs, with a checkpoint every 50 time points
+#rerunning after an interruption resumes from it
+vec_out = checkpoint.run_odeint(fourvar_proneural, vec_ini, t, '4_9D_checkpoint.npz', 50)
 
 #Reshape A, E, D, N
 A = vec_out[:,:Xmax**2].T.reshape(Xmax, Xmax, Tmax)
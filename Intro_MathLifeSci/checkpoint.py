@@ -0,0 +1,107 @@
+"""
+Checkpoints of long grid simulations
+
+A checkpoint is one .npz file holding everything needed to continue a run
+bit for bit: the fields U, the step T and time t, dt, the state of the
+random generator (np.random.Generator, np.random.RandomState or the
+np.random module itself) and the position of the recorder, see
+gridRecorder.MemoryRecorder.state and gridRecorder.DiskRecorder.state.
+
+The file is written to path + '.tmp' and renamed over path, so a job that
+is killed while saving leaves the previous checkpoint intact.
+
+reactionDiffusion.run_checkpointed drives explicit steppers with periodic
+checkpoints; run_odeint does the same for the odeint models of 4_9.
+"""
+
+import json
+import os
+import numpy as np
+from scipy.integrate import odeint
+from gridRecorder import _json_default
+
+
+def _rng_state(rng):
+    if isinstance(rng, np.random.Generator):
+        return rng.bit_generator.state
+    return rng.get_state(legacy=False)
+
+def _set_rng_state(rng, state):
+    if isinstance(rng, np.random.Generator):
+        rng.bit_generator.state = state
+    else:
+        rng.set_state(state)
+
+
+#Writes the checkpoint of step T (time t) atomically
+#arrays -- further named arrays to keep with the run (e.g. odeint output so far)
+def save(path, U, T, t, dt, recorder=None, rng=None, **arrays):
+    data = {'U': U, 'T': T, 't': t, 'dt': dt}
+    if rng is not None:
+        data['rng'] = json.dumps(_rng_state(rng), default=_json_default)
+    if recorder is not None:
+        for key, value in recorder.state().items():
+            data['recorder_' + key] = value
+    for key, value in arrays.items():
+        data['array_' + key] = value
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, **data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+#Reads a checkpoint as a dict with U, T, t, dt and the extra arrays;
+#the recorder and the random generator, if given, are set to the saved state
+#expect -- dict of values the checkpoint must hold (e.g. dt or the initial state
+#of the run); a checkpoint of another run raises ValueError before anything is restored
+def load(path, recorder=None, rng=None, expect=None):
+    with np.load(path) as f:
+        data = {key: f[key] for key in f.files}
+    out = {key[6:]: value for key, value in data.items() if key.startswith('array_')}
+    out.update(U=data['U'], T=int(data['T']), t=float(data['t']), dt=float(data['dt']))
+    differ = [key for key, value in (expect or {}).items()
+              if key not in out or not np.array_equal(out[key], value)]
+    if differ:
+        raise ValueError('checkpoint {} belongs to another run ({} differ)'.format(path, ', '.join(differ)))
+    if recorder is not None:
+        recorder.restore({key[9:]: value for key, value in data.items() if key.startswith('recorder_')})
+    if rng is not None:
+        if 'rng' not in data:
+            raise ValueError('checkpoint {} holds no random generator state'.format(path))
+        _set_rng_state(rng, json.loads(str(data['rng'])))
+    return out
+
+
+#odeint(func, y0, t) in segments of every time points, with a checkpoint
+#after each segment; an existing checkpoint at path is resumed from.
+#The output rows go to the memory-mapped path + '.out.npy' and the checkpoint
+#only records how many are done, so each save costs the same however long the run.
+#y0 and t are kept with the checkpoint; one from a run with other values is refused.
+#The solver restarts at the segment ends, so the result differs from one
+#odeint call within the tolerances, but a resumed run matches an
+#uninterrupted one bit for bit. The checkpoint is removed when done.
+def run_odeint(func, y0, t, path, every=50, **kwargs):
+    t = np.asarray(t, dtype=float)
+    y0 = np.asarray(y0, dtype=float)
+    out_path = path + '.out.npy'
+    i = 0
+    if os.path.exists(path):
+        i = load(path, expect={'y0': y0, 't_eval': t})['T']
+        out = np.lib.format.open_memmap(out_path, mode='r+')
+    else:
+        out = np.lib.format.open_memmap(out_path, mode='w+', dtype=float, shape=(len(t), len(y0)))
+        out[0] = y0
+    while i < len(t) - 1:
+        j = min(i + every, len(t) - 1)
+        out[i:j + 1] = odeint(func, out[i], t[i:j + 1], **kwargs)
+        out.flush()    #rows up to j are on disk before the checkpoint says so
+        i = j
+        save(path, out[i], i, t[i], t[i] - t[i - 1], y0=y0, t_eval=t)
+    result = np.array(out)
+    del out
+    for p in (path, out_path):
+        if os.path.exists(p):
+            os.remove(p)
+    return result
@@ -1,28 +1,38 @@
+import functools
 import numpy as np
+import scipy.fft
+import scipy.linalg
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+
+try:
+    import pyamg
+except ImportError:
+    pyamg = None
 
 #Use this function as a substitute for del2 in MATLAB
+#Vectorized; gives the same values as the cell-by-cell loop, including
+#the cells at index Xmax - 2 / Ymax - 2 that the loop leaves at 0
 def Lap2D(U, dx):
     Xmax, Ymax = U.shape
     L = np.zeros(U.shape)
+    Xi, Yi = slice(1, Xmax - 2), slice(1, Ymax - 2)    #X, Y in range(1, max - 2)
 
     # Do not calc. at the boundaries
-    for X in range(1, Xmax - 2):
-        for Y in range(1, Ymax - 2):
-            L[Y, X] = (U[Y, X - 1] + U[Y, X + 1] + U[Y - 1, X] + U[Y + 1, X] - 4 * U[Y, X]) / dx / dx
+    if Xmax > 3 and Ymax > 3:
+        L[Yi, Xi] = (U[Yi, :Xmax - 3] + U[Yi, 2:Xmax - 1] + U[:Ymax - 3, Xi] + U[2:Ymax - 1, Xi] - 4 * U[Yi, Xi]) / dx / dx
 
-    # Calc. at the horizontal boundaries
-    for X in range(1, Xmax - 2):
+        # Calc. at the horizontal boundaries
         Y = 0
-        L[Y, X] = (U[Y, X - 1] + U[Y, X + 1] + U[Y + 1, X] - 3 * U[Y, X]) / dx / dx
+        L[Y, Xi] = (U[Y, :Xmax - 3] + U[Y, 2:Xmax - 1] + U[Y + 1, Xi] - 3 * U[Y, Xi]) / dx / dx
         Y = Ymax - 1
-        L[Y, X] = (U[Y, X - 1] + U[Y, X + 1] + U[Y - 1, X] - 3 * U[Y, X]) / dx / dx
+        L[Y, Xi] = (U[Y, :Xmax - 3] + U[Y, 2:Xmax - 1] + U[Y - 1, Xi] - 3 * U[Y, Xi]) / dx / dx
 
-    # Calc. at the vertical boundaries
-    for Y in range(1, Ymax - 2):
+        # Calc. at the vertical boundaries
         X = 0
-        L[Y, X] = (U[Y, X + 1] + U[Y - 1, X] + U[Y + 1, X] - 3 * U[Y, X]) / dx / dx
+        L[Yi, X] = (U[Yi, X + 1] + U[:Ymax - 3, X] + U[2:Ymax - 1, X] - 3 * U[Yi, X]) / dx / dx
         X = Xmax - 1
-        L[Y, X] = (U[Y, X - 1] + U[Y - 1, X] + U[Y + 1, X] - 3 * U[Y, X]) / dx / dx
+        L[Yi, X] = (U[Yi, X - 1] + U[:Ymax - 3, X] + U[2:Ymax - 1, X] - 3 * U[Yi, X]) / dx / dx
 
     # Calc. at the corners
     X, Y = 0, 0
@@ -42,23 +52,422 @@ def Lap2D(U, dx):
 #Calc. 2D Laplacian using matrices
 def Lap2DMt(Et, dx2):
     #dx2 = dx*dx
-    Ymax, Xmax = Et.shape
+    if np.ndim(dx2) == 0:
+        return _stencil2D(Et.shape, float(dx2))(Et)
+    #dx2 per cell (or broadcasting against the grid): not cached
+    return Lap2DStencil(Et.shape, 1.)(Et) / dx2
+
+#Stencil operator of Lap2DMt, built once per grid shape
+#The shifted copies Er, El, Eu, Ed are accumulated as slice views into out,
+#so the result is bit for bit the same as (Er + El + Eu + Ed - 4. * Et) / dx2
+#shape may carry leading axes, e.g. (n_species, Ymax, Xmax): the Laplacian
+#is then taken over the last two axes of every field in one pass
+#dtype -- of the workspace and of new results, e.g. np.float32 for half the memory
+class Lap2DStencil:
+    def __init__(self, shape, dx2, dtype=float):
+        self.shape = tuple(shape)
+        self.dx2 = dx2
+        self.dtype = np.dtype(dtype)
+        self._work = np.empty(self.shape, self.dtype)    #holds 4. * Et
+
+    def __call__(self, Et, out=None):
+        if Et.shape != self.shape:
+            raise ValueError('expected grid of shape {}, got {}'.format(self.shape, Et.shape))
+        if out is None:
+            out = np.empty(self.shape, self.dtype)
+        elif np.shares_memory(out, Et):
+            raise ValueError('out must not overlap the input grid')
+
+        #Er
+        out[..., :, :-1] = Et[..., :, 1:]
+        out[..., :, -1] = Et[..., :, -1]
+        #El
+        out[..., :, 1:] += Et[..., :, :-1]
+        out[..., :, 0] += Et[..., :, 0]
+        #Eu
+        out[..., 1:, :] += Et[..., :-1, :]
+        out[..., 0, :] += Et[..., 0, :]
+        #Ed
+        out[..., :-1, :] += Et[..., 1:, :]
+        out[..., -1, :] += Et[..., -1, :]
+
+        np.multiply(Et, 4., out=self._work)
+        out -= self._work
+        out /= self.dx2
+        return out
+
+#One stencil per (shape, dx2) shared by Lap2DMt calls
+@functools.lru_cache(maxsize=32)
+def _stencil2D(shape, dx2):
+    return Lap2DStencil(shape, dx2)
+
+#1D second difference, by default with the reflecting edges of Lap2DMt
+def _diff1D(n, bc='neumann'):
+    main = -2. * np.ones(n)
+    if bc == 'neumann':
+        main[0] += 1.
+        main[-1] += 1.
+    off = np.ones(n - 1)
+    D = sp.diags([off, main, off], [-1, 0, 1], format='lil')
+    if bc == 'periodic':
+        D[0, n - 1] += 1.
+        D[n - 1, 0] += 1.
+    return D.tocsr()
+
+#Lap2DMt as a sparse CSR matrix acting on Et.ravel()
+#Cached by (shape, dx2): treat the returned matrix as read-only
+def Lap2DSparse(shape, dx2):
+    return _lap2DSparse(tuple(int(n) for n in shape), float(dx2))
+
+@functools.lru_cache(maxsize=32)
+def _lap2DSparse(shape, dx2):
+    Ymax, Xmax = shape
+    L = sp.kron(sp.identity(Ymax), _diff1D(Xmax)) + sp.kron(_diff1D(Ymax), sp.identity(Xmax))
+    return (L / dx2).tocsr()
+
+#Grid spacing squared per axis; a scalar dx2 applies to every axis
+def _axis_dx2(shape, dx2):
+    return tuple(float(h) for h in np.broadcast_to(dx2, (len(shape),)))
+
+BOUNDARIES = ('neumann', 'periodic', 'dirichlet')
+
+#Ghost cells per axis as (source of the ghost past the last cell, source of the
+#ghost before the first cell); None means the fixed value of a Dirichlet boundary
+def _ghost_map(shape, bc):
+    if bc not in BOUNDARIES:
+        raise ValueError('unknown boundary condition: {}'.format(bc))
+    if bc == 'neumann':
+        return tuple((n - 1, 0) for n in shape)
+    if bc == 'periodic':
+        return tuple((0, n - 1) for n in shape)
+    return tuple((None, None) for n in shape)
+
+#Laplacian on a grid of any dimension (1D cable, 3D slab, ...)
+#dx2 -- spacing squared, scalar or one value per axis
+#bc -- 'neumann' (zero flux, reflecting edges of Lap2DMt), 'periodic',
+#or 'dirichlet' (ghost cells held at value)
+#dtype -- of the workspace and of new results
+#For 2D Neumann grids with equal spacing the values agree with Lap2DMt to rounding
+class LapNDStencil:
+    def __init__(self, shape, dx2, bc='neumann', value=0., dtype=float):
+        self.shape = tuple(shape)
+        self.dx2 = _axis_dx2(self.shape, dx2)
+        self.bc, self.value = bc, value
+        self.dtype = np.dtype(dtype)
+        self._ghosts = _ghost_map(self.shape, bc)
+        self._work = np.empty(self.shape, self.dtype)
+
+    def _check(self, U, out):
+        if U.shape != self.shape:
+            raise ValueError('expected grid of shape {}, got {}'.format(self.shape, U.shape))
+        if out is None:
+            return np.empty(self.shape, self.dtype)
+        if np.shares_memory(out, U):
+            raise ValueError('out must not overlap the input grid')
+        return out
+
+    #Sum of the two neighbours of every cell along axis into w
+    def _neighbours(self, U, axis, w):
+        u = np.moveaxis(U, axis, 0)
+        w = np.moveaxis(w, axis, 0)
+        last, first = self._ghosts[axis]
+        w[:-1] = u[1:]
+        w[-1] = self.value if last is None else u[last]
+        w[1:] += u[:-1]
+        w[0] += self.value if first is None else u[first]
+
+    def __call__(self, U, out=None):
+        out = self._check(U, out)
+        for axis, h2 in enumerate(self.dx2):
+            w = self._work if axis else out
+            self._neighbours(U, axis, w)
+            w -= U
+            w -= U
+            w /= h2
+            if axis:
+                out += w
+        return out
+
+    #Sum of the neighbours of every cell over all axes (ghost cells included)
+    def neighbour_sum(self, U, out=None):
+        out = self._check(U, out)
+        for axis in range(len(self.shape)):
+            w = self._work if axis else out
+            self._neighbours(U, axis, w)
+            if axis:
+                out += w
+        return out
+
+@functools.lru_cache(maxsize=32)
+def _neighbourStencil(shape, bc):
+    return LapNDStencil(shape, 1., bc=bc)
+
+#Sum of D in neighbouring cells, e.g. Delta seen by Notch in 4_9B-D
+#bc='dirichlet' counts cells outside the grid as 0
+def NeighbourSum(D, bc='dirichlet'):
+    return _neighbourStencil(D.shape, bc).neighbour_sum(D)
+
+#LapNDStencil as a sparse CSR matrix acting on U.ravel()
+#For 'dirichlet' this is the linear part (ghost cells at 0)
+#Cached by (shape, dx2, bc): treat the returned matrix as read-only
+def LapNDSparse(shape, dx2, bc='neumann'):
+    shape = tuple(shape)
+    _ghost_map(shape, bc)
+    return _lapNDSparse(shape, _axis_dx2(shape, dx2), bc)
+
+@functools.lru_cache(maxsize=32)
+def _lapNDSparse(shape, dx2, bc):
+    n = int(np.prod(shape))
+    L = sp.csr_matrix((n, n))
+    for axis, h2 in enumerate(dx2):
+        before = sp.identity(int(np.prod(shape[:axis])))
+        after = sp.identity(int(np.prod(shape[axis + 1:])))
+        L = L + sp.kron(sp.kron(before, _diff1D(shape[axis], bc) / h2), after)
+    return L.tocsr()
+
+#Harmonic mean of the conductivities on both sides of a face (0 if either is 0)
+def _face_conductivity(d1, d2):
+    s = d1 + d2
+    g = np.zeros(np.broadcast(d1, d2).shape)
+    np.divide(2. * d1 * d2, s, out=g, where=s != 0.)
+    return g
+
+#Face conductivities of a conductivity grid d, zero on the outer faces
+#gx[y, x] -- face between cells (y, x - 1) and (y, x), shape (Ymax, Xmax + 1)
+#gy[y, x] -- face between cells (y - 1, x) and (y, x), shape (Ymax + 1, Xmax)
+def _faces2D(d):
+    Ymax, Xmax = d.shape
+    gx = np.zeros((Ymax, Xmax + 1))
+    gy = np.zeros((Ymax + 1, Xmax))
+    gx[:, 1:-1] = _face_conductivity(d[:, :-1], d[:, 1:])
+    gy[1:-1, :] = _face_conductivity(d[:-1, :], d[1:, :])
+    return gx, gy
+
+#Rectangles (y0, y1, x0, x1) covering the True entries of mask: consecutive rows
+#with the same runs of True share one band; None if there are more than limit
+def _rectangles(mask, limit=16):
+    rects, open_rects, prev = [], {}, None
+    for y, row in enumerate(np.vstack([mask, np.zeros((1, mask.shape[1]), bool)])):
+        edges = np.flatnonzero(np.diff(np.concatenate([[0], row.astype(np.int8), [0]])))
+        runs = tuple(zip(edges[::2].tolist(), edges[1::2].tolist()))
+        if runs != prev:
+            rects += [(y0, y) + run for run, y0 in open_rects.items()]
+            open_rects = {run: y for run in runs}
+            prev = runs
+        if len(rects) + len(open_rects) > limit:
+            return None
+    return rects
+
+#Flux-conservative div(d * grad U) for a conductivity grid d (e.g. a conduction
+#block d[40:50, 40:80] = 0 as in 4_8C), zero flux at the outer edges as in Lap2DMt
+#Face conductivities are precomputed; fluxes are only taken over rectangles of
+#conducting faces, so insulated cells are skipped (cells without a conducting
+#face get 0). Masks too ragged for a few rectangles fall back to the bounding box
+class DivGrad2DStencil:
+    def __init__(self, d, dx2, dtype=float):
+        d = np.asarray(d, dtype=float)
+        self.shape = d.shape
+        self.dx2 = dx2
+        self.dtype = np.dtype(dtype)
+        gx, gy = _faces2D(d)
+        self.gx, self.gy = gx.astype(self.dtype), gy.astype(self.dtype)
+        #Inner faces: face x of gx[:, 1:-1] lies between cells x and x + 1
+        self._xfaces = self._face_blocks(gx[:, 1:-1] / dx2)
+        self._yfaces = self._face_blocks(gy[1:-1, :] / dx2)
+
+    #(slices, g / dx2, flux buffer) per rectangle of conducting faces
+    def _face_blocks(self, g):
+        rects = _rectangles(g != 0.)
+        if rects is None:
+            ys, xs = np.nonzero(g)
+            rects = [(int(ys.min()), int(ys.max()) + 1, int(xs.min()), int(xs.max()) + 1)]
+        return [((slice(y0, y1), slice(x0, x1)), g[y0:y1, x0:x1].astype(self.dtype),
+                 np.empty((y1 - y0, x1 - x0), self.dtype)) for y0, y1, x0, x1 in rects]
+
+    def __call__(self, U, out=None):
+        if U.shape != self.shape:
+            raise ValueError('expected grid of shape {}, got {}'.format(self.shape, U.shape))
+        if out is None:
+            out = np.zeros(self.shape, self.dtype)
+        elif np.shares_memory(out, U):
+            raise ValueError('out must not overlap the input grid')
+        else:
+            out.fill(0.)
+
+        #fluxes across vertical faces, between cells x and x + 1
+        for (ys, xs), g, f in self._xfaces:
+            xr = slice(xs.start + 1, xs.stop + 1)
+            np.subtract(U[ys, xr], U[ys, xs], out=f)
+            f *= g
+            out[ys, xs] += f
+            out[ys, xr] -= f
+        #fluxes across horizontal faces, between cells y and y + 1
+        for (ys, xs), g, f in self._yfaces:
+            yd = slice(ys.start + 1, ys.stop + 1)
+            np.subtract(U[yd, xs], U[ys, xs], out=f)
+            f *= g
+            out[ys, xs] += f
+            out[yd, xs] -= f
+        return out
+
+#DivGrad2DStencil as a sparse CSR matrix acting on U.ravel()
+#Rows of cells without a conducting face are empty
+def DivGrad2DSparse(d, dx2):
+    d = np.asarray(d, dtype=float)
+    Ymax, Xmax = d.shape
+    gx, gy = _faces2D(d)
+    idx = np.arange(Ymax * Xmax).reshape(Ymax, Xmax)
+    p = np.concatenate([idx[:, :-1].ravel(), idx[:-1, :].ravel()])
+    q = np.concatenate([idx[:, 1:].ravel(), idx[1:, :].ravel()])
+    g = np.concatenate([gx[:, 1:-1].ravel(), gy[1:-1, :].ravel()])
+    keep = g != 0.
+    p, q, g = p[keep], q[keep], g[keep] / dx2
+    rows = np.concatenate([p, q, p, q])
+    cols = np.concatenate([q, p, p, q])
+    vals = np.concatenate([g, g, -g, -g])
+    return sp.csr_matrix((vals, (rows, cols)), shape=(Ymax * Xmax, Ymax * Xmax))
+
+#Eigenvalues of Lap2DMt; its eigenvectors are the type-II DCT basis
+#Cached by (shape, dx2): treat the returned array as read-only
+def Lap2DEigenvalues(shape, dx2):
+    return _lap2DEigenvalues(tuple(int(n) for n in shape), float(dx2))
+
+@functools.lru_cache(maxsize=32)
+def _lap2DEigenvalues(shape, dx2):
+    lam = [-4. * np.sin(np.pi * np.arange(n) / (2. * n))**2 for n in shape]
+    return (lam[0][:, None] + lam[1][None, :]) / dx2
+
+#Exact propagator of d/dt B = d * Lap2DMt(B) - k * B + c for any dt
+#Each advance is one forward and one inverse DCT
+class SpectralDiffusion:
+    def __init__(self, shape, dx2, d, k=0.):
+        self.shape = tuple(shape)
+        self.d, self.k = d, k
+        self.rate = d * Lap2DEigenvalues(self.shape, dx2) - k    #growth rate of each mode
+        self._factors = {}
+
+    #exp(rate * dt) and (exp(rate * dt) - 1) / rate, cached per dt
+    def _factor(self, dt):
+        if dt not in self._factors:
+            rdt = self.rate * dt
+            phi = np.full(self.shape, float(dt))
+            nz = rdt != 0.
+            phi[nz] = np.expm1(rdt[nz]) / self.rate[nz]
+            self._factors[dt] = (np.exp(rdt), phi)
+        return self._factors[dt]
+
+    def advance(self, B, dt, c=None, out=None):
+        expo, phi = self._factor(dt)
+        Bh = scipy.fft.dctn(B, type=2, norm='ortho')
+        Bh *= expo
+        if c is not None:
+            Bh += phi * scipy.fft.dctn(c, type=2, norm='ortho')
+        res = scipy.fft.idctn(Bh, type=2, norm='ortho', overwrite_x=True)
+        if out is None:
+            return res
+        out[...] = res
+        return out
+
+#Implicit step of d/dt B = d * Lap2DMt(B) - k * B + c
+#theta = 1 -- backward Euler, theta = 0.5 -- Crank-Nicolson
+#(I - theta * dt * A) is factored once with splu and reused for every step
+class ImplicitDiffusion:
+    def __init__(self, shape, dx2, d, dt, k=0., theta=0.5):
+        self.shape = tuple(shape)
+        self.dt, self.theta = dt, theta
+        n = int(np.prod(self.shape))
+        A = d * Lap2DSparse(self.shape, dx2) - k * sp.identity(n, format='csr')
+        self._lu = spla.splu((sp.identity(n) - theta * dt * A).tocsc())
+        self._rhs = (sp.identity(n) + (1. - theta) * dt * A).tocsr() if theta != 1. else None
+
+    def step(self, B, c=None, out=None):
+        b = B.ravel() if self._rhs is None else self._rhs @ B.ravel()
+        if c is not None:
+            b = b + self.dt * np.ravel(c)
+        res = self._lu.solve(b).reshape(self.shape)
+        if out is None:
+            return res
+        out[...] = res
+        return out
+
+#Unscaled 1D reflecting second difference of B along axis (0 or 1) into out
+def _diff_axis(B, axis, out):
+    Bt, Ot = (B, out) if axis == 0 else (B.T, out.T)
+    np.multiply(Bt, -2., out=Ot)
+    Ot[:-1] += Bt[1:]
+    Ot[-1] += Bt[-1]
+    Ot[1:] += Bt[:-1]
+    Ot[0] += Bt[0]
+    return out
 
-    Er = np.zeros(Et.shape)
-    El = np.zeros(Et.shape)
-    Eu = np.zeros(Et.shape)
-    Ed = np.zeros(Et.shape)
+#Banded (I - r * D - s) of the 1D reflecting second difference, for solve_banded
+def _banded1D(n, r, s):
+    ab = np.zeros((3, n))
+    ab[0, 1:] = -r
+    ab[1, :] = 1. + 2. * r + s
+    ab[1, 0] -= r
+    ab[1, -1] -= r
+    ab[2, :-1] = -r
+    return ab
 
-    Er[:, Xmax - 1] = Et[:, Xmax - 1]
-    Er[:, :Xmax - 1] = Et[:, 1:]
+#Peaceman-Rachford ADI step of d/dt B = d * Lap2DMt(B) - k * B + c
+#Each half step is implicit along one axis and solved for all rows (columns)
+#at once with solve_banded, so the cost per step is O(Xmax * Ymax)
+class ADIDiffusion:
+    def __init__(self, shape, dx2, d, dt, k=0.):
+        self.shape = tuple(shape)
+        self.dt = dt
+        self._r = 0.5 * dt * d / dx2    #half step diffusion number
+        self._s = 0.25 * dt * k         #half of the decay per half step
+        self._ab = [_banded1D(n, self._r, self._s) for n in self.shape]
+        self._work = np.empty(self.shape)
+        self._rhs = np.empty(self.shape)
 
-    El[:, 0] = Et[:, 0]
-    El[:, 1:] = Et[:, :Xmax - 1]
+    #(1 - s) * B + r * D(B) along axis into self._rhs
+    def _explicit(self, B, axis, c):
+        rhs = self._rhs
+        _diff_axis(B, axis, self._work)
+        np.multiply(B, 1. - self._s, out=rhs)
+        self._work *= self._r
+        rhs += self._work
+        if c is not None:
+            rhs += 0.5 * self.dt * c
+        return rhs
 
-    Ed[Ymax - 1, :] = Et[Ymax - 1, :]
-    Ed[:Ymax - 1, :] = Et[1:, :]
+    def step(self, B, c=None, out=None):
+        #implicit in X (axis 1), explicit in Y
+        rhs = self._explicit(B, 0, c)
+        Bh = scipy.linalg.solve_banded((1, 1), self._ab[1], rhs.T, check_finite=False).T
+        #implicit in Y (axis 0), explicit in X
+        rhs = self._explicit(Bh, 1, c)
+        res = scipy.linalg.solve_banded((1, 1), self._ab[0], rhs, overwrite_b=True, check_finite=False)
+        if out is None:
+            return res
+        out[...] = res
+        return out
 
-    Eu[0, :] = Et[0, :]
-    Eu[1:, :] = Et[:Ymax - 1, :]
+#Steady state of d/dt B = d * Lap2DMt(B) - k * B + c, i.e. (d * L - k) * B = -c
+#method='direct' -- sparse LU
+#method='cg' -- conjugate gradients on the SPD matrix (k - d * L), preconditioned
+#by algebraic multigrid when pyamg is installed, by its diagonal otherwise
+def Lap2DSteadyState(c, dx2, d, k, method='direct', tol=1e-10):
+    if k <= 0.:
+        raise ValueError('k must be > 0: with reflecting boundaries there is no steady state for k = 0')
+    shape = c.shape
+    n = int(np.prod(shape))
+    A = (k * sp.identity(n, format='csr') - d * Lap2DSparse(shape, dx2)).tocsr()
+    b = np.ravel(c).astype(float)
 
-    return (Er + El + Eu + Ed - 4. * Et) / dx2
+    if method == 'direct':
+        B = spla.spsolve(A.tocsc(), b)
+    elif method == 'cg':
+        if pyamg is not None:
+            M = pyamg.smoothed_aggregation_solver(A).aspreconditioner()
+        else:
+            M = sp.diags(1. / A.diagonal())
+        B, info = spla.cg(A, b, rtol=tol, M=M)
+        if info != 0:
+            raise RuntimeError('CG did not converge (info = {})'.format(info))
+    else:
+        raise ValueError('unknown method: {}'.format(method))
+    return B.reshape(shape)
@@ -0,0 +1,125 @@
+"""
+Reaction-diffusion on large grids with one process per strip of rows
+
+The stacked fields U (n_species, Ymax, Xmax) live twice in one
+multiprocessing.shared_memory block (current and next time step).
+Each worker advances its strip of rows by forward Euler with the
+reflecting Laplacian of discreteLaplacian.Lap2DMt, reading the one-row
+halos above and below its strip straight from the neighbouring strips,
+then waits at a barrier so no strip starts step T + 1 before all strips
+have finished step T.
+
+The reaction term is added in place by a top-level (picklable) function
+
+    reaction(U, dUdt, rows)
+
+where U and dUdt are the (n_species, rows, Xmax) parts of the strip and
+rows is the slice of grid rows they cover, for position-dependent
+parameters such as the stimulus I[rows] of 4_8B.
+"""
+
+import os
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+
+
+#Laplacian of rows y0:y1 of the stacked grid U into out, bit for bit as Lap2DMt
+def _strip_laplacian(U, y0, y1, dx2, out, work):
+    Ymax = U.shape[1]
+    u = U[:, y0:y1, :]
+    #Er, El
+    out[..., :, :-1] = u[..., :, 1:]
+    out[..., :, -1] = u[..., :, -1]
+    out[..., :, 1:] += u[..., :, :-1]
+    out[..., :, 0] += u[..., :, 0]
+    #Eu, with the halo row y0 - 1 from the strip above
+    if y0 > 0:
+        out += U[:, y0 - 1:y1 - 1, :]
+    else:
+        out[..., 1:, :] += U[:, :y1 - 1, :]
+        out[..., 0, :] += U[:, 0, :]
+    #Ed, with the halo row y1 from the strip below
+    if y1 < Ymax:
+        out += U[:, y0 + 1:y1 + 1, :]
+    else:
+        out[..., :-1, :] += U[:, y0 + 1:, :]
+        out[..., -1, :] += U[:, -1, :]
+    np.multiply(u, 4., out=work)
+    out -= work
+    out /= dx2
+    return out
+
+
+def _worker(name, shape, dtype, dx2, d, reaction, dt, y0, y1, nsteps, barrier):
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        buf = np.ndarray((2,) + shape, dtype=dtype, buffer=shm.buf)
+        rows = slice(y0, y1)
+        dUdt = np.empty((shape[0], y1 - y0, shape[2]), dtype)
+        lap = np.empty_like(dUdt)
+        work = np.empty_like(dUdt)
+        for T in range(nsteps):
+            U, Unext = buf[T % 2], buf[(T + 1) % 2]
+            _strip_laplacian(U, y0, y1, dx2, lap, work)
+            np.multiply(lap, d[:, None, None], out=dUdt)
+            reaction(U[:, rows, :], dUdt, rows)
+            dUdt *= dt
+            np.add(U[:, rows, :], dUdt, out=Unext[:, rows, :])
+            barrier.wait()
+    except BaseException:
+        barrier.abort()    #release the other strips instead of leaving them waiting
+        raise
+    finally:
+        del buf
+        shm.close()
+
+
+#Forward Euler for stacked fields, split into strips of rows over nworkers processes
+class TiledRunner:
+    def __init__(self, shape, dx2, d, reaction, dt, nworkers=None, dtype=float):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.dx2, self.reaction, self.dt = dx2, reaction, dt
+        self.d = np.asarray(d, dtype=self.dtype)
+        if self.d.shape != (self.shape[0],):
+            raise ValueError('need one diffusion coefficient per species')
+        nworkers = nworkers or os.cpu_count() or 1
+        self.nworkers = max(1, min(nworkers, self.shape[1]))
+        edges = np.linspace(0, self.shape[1], self.nworkers + 1).astype(int)
+        self.strips = list(zip(edges[:-1], edges[1:]))
+        self.t = 0.
+
+    #Advance U (in place) by nsteps time steps
+    def run(self, U, nsteps):
+        if U.shape != self.shape:
+            raise ValueError('expected fields of shape {}, got {}'.format(self.shape, U.shape))
+        ctx = multiprocessing.get_context()
+        shm = shared_memory.SharedMemory(create=True, size=2 * U.size * self.dtype.itemsize)
+        try:
+            buf = np.ndarray((2,) + self.shape, dtype=self.dtype, buffer=shm.buf)
+            buf[0] = U
+            barrier = ctx.Barrier(self.nworkers)
+            workers = [ctx.Process(target=_worker,
+                                   args=(shm.name, self.shape, self.dtype, self.dx2, self.d, self.reaction,
+                                         self.dt, int(y0), int(y1), nsteps, barrier))
+                       for y0, y1 in self.strips]
+            for p in workers:
+                p.start()
+            #A worker killed by a signal (OOM, preemption) never reaches its own
+            #barrier.abort(), so the parent watches the exit codes and aborts for it
+            while any(p.is_alive() for p in workers):
+                if any(p.exitcode not in (None, 0) for p in workers):
+                    barrier.abort()
+                for p in workers:
+                    p.join(timeout=0.1)
+            failed = [p.exitcode for p in workers if p.exitcode != 0]
+            if failed:
+                raise RuntimeError('a strip worker failed (exit codes {}); see the traceback above'.format(failed))
+            U[...] = buf[nsteps % 2]
+            self.t += nsteps * self.dt
+            del buf
+        finally:
+            shm.close()
+            shm.unlink()
+        return U
@@ -0,0 +1,319 @@
+"""
+Fused explicit Euler steps for the grid models
+
+FHNStepper -- FHN heart tissue (4_8B, 4_8C)
+d/dt V = c * {-V**3 / 3 + V - W + I} + d * (Laplacian) * V
+d/dt W = {V - b * W + a} / c
+
+MultirateFHNStepper -- the same tissue, W stepped once per `substeps` steps of V
+
+ClippedTuringStepper -- Turing model with clipped production (4_7D)
+d/dt A = da * (Laplacian) * A - ka * A + Ap, Ap = c1 * A + c2 * I + c3, 0 <= Ap <= Apmax
+d/dt I = di * (Laplacian) * I - ki * I + Ip, Ip = c4 * A + c5 * I + c6, 0 <= Ip <= Ipmax
+
+The Laplacian has the reflecting boundaries of discreteLaplacian.Lap2DMt.
+With backend='numba' (default when Numba is installed) the Laplacian and the
+reaction are computed in one compiled loop over the grid; backend='numpy'
+uses Lap2DStencil and in-place array operations on preallocated buffers.
+
+dtype=np.float32 keeps the grids, buffers and scalar parameters in single
+precision (half the memory traffic); the fields passed to step() must
+then be float32 as well.
+"""
+
+import numpy as np
+import discreteLaplacian
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+HAVE_NUMBA = numba is not None
+prange = numba.prange if HAVE_NUMBA else range
+
+
+def _select_backend(backend):
+    if backend == 'auto':
+        return 'numba' if HAVE_NUMBA else 'numpy'
+    if backend == 'numba' and not HAVE_NUMBA:
+        raise ImportError('backend "numba" requested but Numba is not installed')
+    if backend not in ('numba', 'numpy'):
+        raise ValueError('unknown backend: {}'.format(backend))
+    return backend
+
+
+def _check_out(inputs, outputs):
+    for out in outputs:
+        for arr in inputs:
+            if np.shares_memory(out, arr):
+                raise ValueError('output grids must not overlap the input grids')
+
+
+#Compiled loops; neighbours are clamped at the edges (reflecting boundary)
+#The constants three, four and zero come in as the stepper's dtype: a float
+#literal is float64 in Numba and would turn a float32 step into a float64 one
+def _fhn_loop(V, W, I, d, a, b, c, dt, dx2, three, four, Vout, Wout):
+    Ymax, Xmax = V.shape
+    for y in prange(Ymax):
+        yu = y - 1 if y > 0 else 0
+        yd = y + 1 if y < Ymax - 1 else Ymax - 1
+        for x in range(Xmax):
+            xl = x - 1 if x > 0 else 0
+            xr = x + 1 if x < Xmax - 1 else Xmax - 1
+            v, w = V[y, x], W[y, x]
+            lap = (V[y, xr] + V[y, xl] + V[yu, x] + V[yd, x] - four * v) / dx2
+            Vout[y, x] = v + dt * (c * (-v**3 / three + v - w + I[y, x]) + d[y, x] * lap)
+            Wout[y, x] = w + dt * (v - b * w + a) / c
+
+
+#As _fhn_loop, with div(d * grad V) from the face conductivities of DivGrad2DStencil
+def _fhn_faces_loop(V, W, I, gx, gy, a, b, c, dt, dx2, three, Vout, Wout):
+    Ymax, Xmax = V.shape
+    for y in prange(Ymax):
+        yu = y - 1 if y > 0 else 0
+        yd = y + 1 if y < Ymax - 1 else Ymax - 1
+        for x in range(Xmax):
+            xl = x - 1 if x > 0 else 0
+            xr = x + 1 if x < Xmax - 1 else Xmax - 1
+            v, w = V[y, x], W[y, x]
+            lap = (gx[y, x + 1] * (V[y, xr] - v) + gx[y, x] * (V[y, xl] - v)
+                   + gy[y + 1, x] * (V[yd, x] - v) + gy[y, x] * (V[yu, x] - v)) / dx2
+            Vout[y, x] = v + dt * (c * (-v**3 / three + v - w + I[y, x]) + lap)
+            Wout[y, x] = w + dt * (v - b * w + a) / c
+
+
+#V part of _fhn_loop with W extrapolated to W + tk * G; V is also added to Vsum
+def _fhn_v_loop(V, W, G, tk, I, d, c, dt, dx2, three, four, Vout, Vsum):
+    Ymax, Xmax = V.shape
+    for y in prange(Ymax):
+        yu = y - 1 if y > 0 else 0
+        yd = y + 1 if y < Ymax - 1 else Ymax - 1
+        for x in range(Xmax):
+            xl = x - 1 if x > 0 else 0
+            xr = x + 1 if x < Xmax - 1 else Xmax - 1
+            v = V[y, x]
+            lap = (V[y, xr] + V[y, xl] + V[yu, x] + V[yd, x] - four * v) / dx2
+            w = W[y, x] + tk * G[y, x]
+            Vout[y, x] = v + dt * (c * (-v**3 / three + v - w + I[y, x]) + d[y, x] * lap)
+            Vsum[y, x] += v
+
+
+def _fhn_v_faces_loop(V, W, G, tk, I, gx, gy, c, dt, dx2, three, Vout, Vsum):
+    Ymax, Xmax = V.shape
+    for y in prange(Ymax):
+        yu = y - 1 if y > 0 else 0
+        yd = y + 1 if y < Ymax - 1 else Ymax - 1
+        for x in range(Xmax):
+            xl = x - 1 if x > 0 else 0
+            xr = x + 1 if x < Xmax - 1 else Xmax - 1
+            v = V[y, x]
+            lap = (gx[y, x + 1] * (V[y, xr] - v) + gx[y, x] * (V[y, xl] - v)
+                   + gy[y + 1, x] * (V[yd, x] - v) + gy[y, x] * (V[yu, x] - v)) / dx2
+            w = W[y, x] + tk * G[y, x]
+            Vout[y, x] = v + dt * (c * (-v**3 / three + v - w + I[y, x]) + lap)
+            Vsum[y, x] += v
+
+
+def _turing_loop(A, I, da, di, ka, ki, c1, c2, c3, c4, c5, c6, Apmax, Ipmax, dt, dx2, four, zero, Aout, Iout):
+    Ymax, Xmax = A.shape
+    for y in prange(Ymax):
+        yu = y - 1 if y > 0 else 0
+        yd = y + 1 if y < Ymax - 1 else Ymax - 1
+        for x in range(Xmax):
+            xl = x - 1 if x > 0 else 0
+            xr = x + 1 if x < Xmax - 1 else Xmax - 1
+            u, v = A[y, x], I[y, x]
+            lapA = (A[y, xr] + A[y, xl] + A[yu, x] + A[yd, x] - four * u) / dx2
+            lapI = (I[y, xr] + I[y, xl] + I[yu, x] + I[yd, x] - four * v) / dx2
+            Ap = min(max(c1 * u + c2 * v + c3, zero), Apmax)
+            Ip = min(max(c4 * u + c5 * v + c6, zero), Ipmax)
+            Aout[y, x] = dt * (da * lapA - ka * u + Ap) + u
+            Iout[y, x] = dt * (di * lapI - ki * v + Ip) + v
+
+
+if HAVE_NUMBA:
+    _fhn_kernel = numba.njit(parallel=True, cache=True)(_fhn_loop)
+    _fhn_faces_kernel = numba.njit(parallel=True, cache=True)(_fhn_faces_loop)
+    _fhn_v_kernel = numba.njit(parallel=True, cache=True)(_fhn_v_loop)
+    _fhn_v_faces_kernel = numba.njit(parallel=True, cache=True)(_fhn_v_faces_loop)
+    _turing_kernel = numba.njit(parallel=True, cache=True)(_turing_loop)
+
+
+#One Euler step of the FHN tissue, V, W -> Vout, Wout
+#d may be a scalar or a grid (conduction block in 4_8C); d * (Laplacian) * V is
+#used as in the scripts, or the flux-conservative div(d * grad V) with
+#conservative=True (see discreteLaplacian.DivGrad2DStencil)
+class FHNStepper:
+    def __init__(self, shape, dx2, d, a, b, c, I, dt, backend='auto', conservative=False, dtype=float):
+        self.shape = tuple(shape)
+        self.backend = _select_backend(backend)
+        self.conservative = conservative
+        self.dtype = np.dtype(dtype)
+        self.dx2, self.a, self.b, self.c, self.dt = (self.dtype.type(p) for p in (dx2, a, b, c, dt))
+        self._three, self._four = self.dtype.type(3.), self.dtype.type(4.)
+        self.d = np.ascontiguousarray(np.broadcast_to(np.asarray(d, dtype=self.dtype), self.shape))
+        self.I = np.ascontiguousarray(np.broadcast_to(np.asarray(I, dtype=self.dtype), self.shape))
+        if conservative:
+            self._stencil = discreteLaplacian.DivGrad2DStencil(self.d, dx2, self.dtype)
+        elif self.backend == 'numpy':
+            self._stencil = discreteLaplacian.Lap2DStencil(self.shape, dx2, self.dtype)
+        if self.backend == 'numpy':
+            self._lap = np.empty(self.shape, self.dtype)
+            self._tmp = np.empty(self.shape, self.dtype)
+
+    def step(self, V, W, Vout, Wout):
+        _check_out((V, W), (Vout, Wout))
+        if self.backend == 'numba':
+            if self.conservative:
+                _fhn_faces_kernel(V, W, self.I, self._stencil.gx, self._stencil.gy,
+                                  self.a, self.b, self.c, self.dt, self.dx2, self._three, Vout, Wout)
+            else:
+                _fhn_kernel(V, W, self.I, self.d, self.a, self.b, self.c, self.dt, self.dx2,
+                            self._three, self._four, Vout, Wout)
+            return Vout, Wout
+
+        lap, tmp = self._lap, self._tmp
+        self._stencil(V, out=lap)
+        if not self.conservative:
+            lap *= self.d
+        #Wout = W + dt * (V - b * W + a) / c
+        np.multiply(W, -self.b, out=tmp)
+        tmp += V
+        tmp += self.a
+        tmp *= self.dt / self.c
+        np.add(W, tmp, out=Wout)
+        #Vout = V + dt * (c * (-V**3 / 3 + V - W + I) + d * lap)
+        np.multiply(V, V, out=tmp)
+        tmp *= V
+        tmp /= -3.
+        tmp += V
+        tmp -= W
+        tmp += self.I
+        tmp *= self.c
+        tmp += lap
+        tmp *= self.dt
+        np.add(V, tmp, out=Vout)
+        return Vout, Wout
+
+
+#Multirate Euler for the FHN tissue: W changes on a timescale c**2 slower than V
+#One step() advances V, W -> Vout, Wout by the macro step H = substeps * dt:
+#G = dW/dt is evaluated once at the start, V (with diffusion) takes substeps
+#Euler steps of dt against W extrapolated along G, then W takes one step of H
+#driven by the mean of V over the substeps and the midpoint W + H / 2 * G
+#The W right-hand side is evaluated twice per macro step, substeps / 2 times
+#less often than with FHNStepper (10x fewer with the default substeps=20)
+#Parameters as FHNStepper; dt is the (fast) step of V
+class MultirateFHNStepper(FHNStepper):
+    def __init__(self, shape, dx2, d, a, b, c, I, dt, substeps=20, backend='auto', conservative=False, dtype=float):
+        super().__init__(shape, dx2, d, a, b, c, I, dt, backend, conservative, dtype)
+        self.substeps = substeps
+        self.H = self.dtype.type(substeps * dt)
+        self._V = np.empty(self.shape, self.dtype)
+        self._G = np.empty(self.shape, self.dtype)
+        self._Vsum = np.empty(self.shape, self.dtype)
+        if self.backend == 'numpy':
+            self._W = np.empty(self.shape, self.dtype)
+
+    #One Euler step of V into Vout against W + tk * G, adding V to the running sum
+    def _fast(self, V, W, tk, Vout):
+        G = self._G
+        if self.backend == 'numba':
+            if self.conservative:
+                _fhn_v_faces_kernel(V, W, G, tk, self.I, self._stencil.gx, self._stencil.gy,
+                                    self.c, self.dt, self.dx2, self._three, Vout, self._Vsum)
+            else:
+                _fhn_v_kernel(V, W, G, tk, self.I, self.d, self.c, self.dt, self.dx2,
+                              self._three, self._four, Vout, self._Vsum)
+            return
+        lap, tmp, Wk = self._lap, self._tmp, self._W
+        self._Vsum += V
+        np.multiply(G, tk, out=Wk)
+        Wk += W
+        self._stencil(V, out=lap)
+        if not self.conservative:
+            lap *= self.d
+        np.multiply(V, V, out=tmp)
+        tmp *= V
+        tmp /= -3.
+        tmp += V
+        tmp -= Wk
+        tmp += self.I
+        tmp *= self.c
+        tmp += lap
+        tmp *= self.dt
+        np.add(V, tmp, out=Vout)
+
+    def step(self, V, W, Vout, Wout):
+        _check_out((V, W), (Vout, Wout))
+        #G = (V - b * W + a) / c
+        G = self._G
+        np.multiply(W, -self.b, out=G)
+        G += V
+        G += self.a
+        G /= self.c
+        self._Vsum.fill(0.)
+        #Alternate between the work buffer and Vout, so the last substep lands in Vout
+        src = V
+        for k in range(self.substeps):
+            dst = Vout if (self.substeps - 1 - k) % 2 == 0 else self._V
+            self._fast(src, W, self.dtype.type(k * self.dt), dst)
+            src = dst
+        #Wout = W + H * (mean V - b * (W + H / 2 * G) + a) / c
+        np.multiply(G, self.H / 2., out=Wout)
+        Wout += W
+        Vsum = self._Vsum
+        Vsum /= self.substeps
+        np.multiply(Wout, self.b, out=self._V)    #the work buffer is free again
+        Vsum -= self._V
+        Vsum += self.a
+        Vsum *= self.H / self.c
+        np.add(W, Vsum, out=Wout)
+        return Vout, Wout
+
+
+#One Euler step of the clipped Turing model, A, I -> Aout, Iout
+class ClippedTuringStepper:
+    def __init__(self, shape, dx2, da, di, ka, ki, c1, c2, c3, c4, c5, c6, Apmax, Ipmax, dt, backend='auto', dtype=float):
+        self.shape = tuple(shape)
+        self.backend = _select_backend(backend)
+        self.dtype = np.dtype(dtype)
+        f = self.dtype.type
+        self.dx2, self.dt = f(dx2), f(dt)
+        self.da, self.di, self.ka, self.ki = f(da), f(di), f(ka), f(ki)
+        self.c1, self.c2, self.c3, self.c4, self.c5, self.c6 = f(c1), f(c2), f(c3), f(c4), f(c5), f(c6)
+        self.Apmax, self.Ipmax = f(Apmax), f(Ipmax)
+        self._four, self._zero = f(4.), f(0.)
+        if self.backend == 'numpy':
+            self._stencil = discreteLaplacian.Lap2DStencil(self.shape, dx2, self.dtype)
+            self._lap = np.empty(self.shape, self.dtype)
+            self._tmp = np.empty(self.shape, self.dtype)
+
+    #dt * (d * lap(U) - k * U + clip(cu * U + cv * V + c0, 0, pmax)) + U into out
+    def _update(self, U, V, d, k, cu, cv, c0, pmax, out):
+        lap, tmp = self._lap, self._tmp
+        np.multiply(U, cu, out=tmp)
+        np.multiply(V, cv, out=lap)
+        tmp += lap
+        tmp += c0
+        np.clip(tmp, 0., pmax, out=tmp)
+        self._stencil(U, out=lap)
+        lap *= d
+        tmp += lap
+        np.multiply(U, k, out=lap)
+        tmp -= lap
+        tmp *= self.dt
+        np.add(tmp, U, out=out)
+
+    def step(self, A, I, Aout, Iout):
+        _check_out((A, I), (Aout, Iout))
+        if self.backend == 'numba':
+            _turing_kernel(A, I, self.da, self.di, self.ka, self.ki,
+                           self.c1, self.c2, self.c3, self.c4, self.c5, self.c6,
+                           self.Apmax, self.Ipmax, self.dt, self.dx2, self._four, self._zero, Aout, Iout)
+            return Aout, Iout
+
+        self._update(A, I, self.da, self.ka, self.c1, self.c2, self.c3, self.Apmax, Aout)
+        self._update(I, A, self.di, self.ki, self.c5, self.c4, self.c6, self.Ipmax, Iout)
+        return Aout, Iout
@@ -0,0 +1,209 @@
+"""
+Recorders for decimated snapshots of grid simulations
+
+A recorder is called as recorder(T, t, U) with the step number T, the time t
+and the stacked fields U (n_fields, Ymax, Xmax), see reactionDiffusion.run_streaming.
+"""
+
+import json
+import os
+import numpy as np
+
+
+#Keeps the snapshots in memory
+class MemoryRecorder:
+    def __init__(self):
+        self.steps = []
+        self.times = []
+        self._frames = []
+
+    def __call__(self, T, t, U):
+        self.steps.append(T)
+        self.times.append(t)
+        self._frames.append(np.array(U, copy=True))
+
+    #Snapshots as one array (n_frames, n_fields, Ymax, Xmax)
+    @property
+    def frames(self):
+        return np.stack(self._frames)
+
+    #Recorded snapshots as arrays, for checkpoint.save
+    #Every checkpoint rewrites all frames so far, so the saves of a long run grow
+    #with its length; checkpointed long runs should record with DiskRecorder
+    def state(self):
+        frames = self.frames if self._frames else np.empty(0)
+        return {'steps': np.array(self.steps, dtype=np.int64), 'times': np.array(self.times), 'frames': frames}
+
+    def restore(self, state):
+        self.steps = state['steps'].tolist()
+        self.times = state['times'].tolist()
+        self._frames = list(state['frames'])
+
+
+#numpy scalars and arrays in the parameters (or a random generator state), as plain JSON values
+def _json_default(obj):
+    if isinstance(obj, (np.generic, np.ndarray)):
+        return obj.tolist()
+    raise TypeError('value of type {} cannot be stored as JSON'.format(type(obj).__name__))
+
+#Writes meta.json atomically, so a reader never sees a half-written file
+def _write_json(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f, default=_json_default)
+    os.replace(tmp, path)
+
+def _chunk_file(path, name, k):
+    return os.path.join(path, '{}_{:05d}.npy'.format(name, k))
+
+
+#Appends the snapshots to memory-mapped .npy files in the directory path,
+#one file per field and per chunk of frames (e.g. V_00000.npy, W_00000.npy, ...)
+#names -- one name per field of U, e.g. ['V', 'W']
+#params -- model parameters stored with the run (JSON-serializable)
+class DiskRecorder:
+    def __init__(self, path, names, shape, chunk=100, params=None, dtype=float):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.names = list(names)
+        self.shape = tuple(shape)
+        self.chunk = chunk
+        self.params = params or {}
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self._maps = None
+        self._write_meta()
+
+    def _write_meta(self):
+        _write_json(os.path.join(self.path, 'meta.json'), {
+            'names': self.names, 'shape': self.shape, 'chunk': self.chunk,
+            'dtype': self.dtype.str, 'count': self.count, 'params': self.params})
+
+    def _new_chunk(self):
+        k = self.count // self.chunk
+        open_memmap = np.lib.format.open_memmap
+        self._maps = {name: open_memmap(_chunk_file(self.path, name, k), mode='w+',
+                                        dtype=self.dtype, shape=(self.chunk,) + self.shape)
+                      for name in self.names}
+        self._maps['steps'] = open_memmap(_chunk_file(self.path, 'steps', k), mode='w+',
+                                          dtype=np.int64, shape=(self.chunk,))
+        self._maps['times'] = open_memmap(_chunk_file(self.path, 'times', k), mode='w+',
+                                          dtype=float, shape=(self.chunk,))
+
+    #Reopens the chunk holding frame count, for appending after a restore
+    def _open_chunk(self):
+        k = self.count // self.chunk
+        self._maps = {name: np.lib.format.open_memmap(_chunk_file(self.path, name, k), mode='r+')
+                      for name in self.names + ['steps', 'times']}
+
+    def __call__(self, T, t, U):
+        if len(U) != len(self.names):
+            raise ValueError('expected {} fields, got {}'.format(len(self.names), len(U)))
+        i = self.count % self.chunk
+        if i == 0:
+            self._new_chunk()
+        for name, field in zip(self.names, U):
+            self._maps[name][i] = field
+        self._maps['steps'][i] = T
+        self._maps['times'][i] = t
+        self.count += 1
+        if i == self.chunk - 1:
+            self.flush()
+            self._maps = None
+
+    #Writes the open chunk to disk and updates the frame count in meta.json
+    def flush(self):
+        if self._maps is not None:
+            for m in self._maps.values():
+                m.flush()
+        self._write_meta()
+
+    #Frame count, after writing the frames so far to disk; for checkpoint.save
+    def state(self):
+        self.flush()
+        return {'count': np.array(self.count)}
+
+    #Rewinds to a saved frame count; later frames are overwritten as the run goes on
+    def restore(self, state):
+        self.count = int(state['count'])
+        if self.count % self.chunk:
+            self._open_chunk()
+        else:
+            self._maps = None
+        self._write_meta()
+
+    def close(self):
+        self.flush()
+        self._maps = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+#Read-back of a DiskRecorder directory; the fields are loaded lazily
+#store['V'][i] -- frame i of V, store['V'][::10, 40:60, :] -- any numpy index
+#whose first entry selects frames; only the chunks holding them are read
+class SnapshotStore:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        self.names = meta['names']
+        self.shape = tuple(meta['shape'])
+        self.chunk = meta['chunk']
+        self.count = meta['count']
+        self.params = meta['params']
+        self.dtype = np.dtype(meta['dtype'])
+        self._cache = {}
+        self.steps = self._read('steps', slice(None))
+        self.times = self._read('times', slice(None))
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, name):
+        if name not in self.names:
+            raise KeyError(name)
+        return _LazyField(self, name)
+
+    def _chunk(self, name, k):
+        if (name, k) not in self._cache:
+            self._cache[name, k] = np.load(_chunk_file(self.path, name, k), mmap_mode='r')
+        return self._cache[name, k]
+
+    def _read(self, name, key):
+        key = key if isinstance(key, tuple) else (key,)
+        frames, rest = key[0], key[1:]
+        if isinstance(frames, (int, np.integer)):
+            i = range(self.count)[frames]
+            return np.array(self._chunk(name, i // self.chunk)[(i % self.chunk,) + rest])
+        idx = np.arange(self.count)[frames]
+        if not len(idx):
+            return np.empty((0,) + (self.shape if name in self.names else ()))[(slice(None),) + rest]
+        #Read each chunk once, then put its frames back where the index asked for them
+        out = None
+        for k in np.unique(idx // self.chunk):
+            pos = np.nonzero(idx // self.chunk == k)[0]
+            part = self._chunk(name, k)[(idx[pos] % self.chunk,) + rest]
+            if out is None:
+                out = np.empty((len(idx),) + part.shape[1:], part.dtype)
+            out[pos] = part
+        return out
+
+
+class _LazyField:
+    def __init__(self, store, name):
+        self.store, self.name = store, name
+
+    def __len__(self):
+        return self.store.count
+
+    @property
+    def shape(self):
+        return (self.store.count,) + self.store.shape
+
+    def __getitem__(self, key):
+        return self.store._read(self.name, key)
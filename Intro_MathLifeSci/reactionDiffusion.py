@@ -0,0 +1,529 @@
+"""
+Time stepping of reaction-diffusion systems on a 2D grid
+
+All species are held in one stacked array U of shape (n_species, Ymax, Xmax).
+The diffusion term d[i] * (Laplacian) * U[i] of every diffusing species
+is taken in a single stencil pass; the reaction term is then added in place
+by a user function
+
+    reaction(U, dUdt)
+
+which must add the reaction part of dU/dt to dUdt (already holding the
+diffusion part) without rebinding it.
+
+dtype sets the precision of every internal buffer; with np.float32 the
+state U should be float32 too, and the reaction should keep its arrays
+in float32 (Python float constants do not upcast).
+"""
+
+import functools
+import os
+import numpy as np
+import scipy.fft
+import scipy.linalg
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+import discreteLaplacian
+import checkpoint
+
+METHODS = {'euler': 1, 'heun': 2, 'rk4': 4}    #number of stages
+STABILITY = {'euler': 2., 'heun': 2., 'rk4': 2.785}    #stable |dt * lambda| on the negative real axis
+
+
+#Explicit one-step integrator for stacked grid fields
+#rhs(U, dUdt) -- writes dU/dt into dUdt in place (e.g. RDStepper.rhs)
+#method -- 'euler', 'heun' (2nd order) or 'rk4' (classical 4th order)
+#All stage buffers are allocated once
+class GridIntegrator:
+    def __init__(self, rhs, shape, dt, method='euler', dtype=float):
+        if method not in METHODS:
+            raise ValueError('unknown method: {}'.format(method))
+        self.rhs = rhs
+        self.shape = tuple(shape)
+        self.dt = dt
+        self.method = method
+        self.dtype = np.dtype(dtype)
+        self.t = 0.
+        self._k = [np.empty(self.shape, self.dtype) for _ in range(METHODS[method])]
+        self._tmp = np.empty(self.shape, self.dtype)
+
+    #Advance U by one time step, into Unext or in place
+    def step(self, U, Unext=None):
+        f, dt, k, tmp = self.rhs, self.dt, self._k, self._tmp
+        f(U, k[0])
+        if self.method == 'euler':
+            np.multiply(k[0], dt, out=tmp)
+        elif self.method == 'heun':
+            np.multiply(k[0], dt, out=tmp)
+            tmp += U
+            f(tmp, k[1])
+            np.add(k[0], k[1], out=tmp)
+            tmp *= 0.5 * dt
+        else:
+            np.multiply(k[0], 0.5 * dt, out=tmp)
+            tmp += U
+            f(tmp, k[1])
+            np.multiply(k[1], 0.5 * dt, out=tmp)
+            tmp += U
+            f(tmp, k[2])
+            np.multiply(k[2], dt, out=tmp)
+            tmp += U
+            f(tmp, k[3])
+            #(k1 + 2 * k2 + 2 * k3 + k4) * dt / 6
+            k[1] += k[2]
+            k[1] *= 2.
+            k[1] += k[0]
+            k[1] += k[3]
+            np.multiply(k[1], dt / 6., out=tmp)
+        out = U if Unext is None else Unext
+        np.add(U, tmp, out=out)
+        self.t += dt
+        return out
+
+
+#Stepper for stacked fields, boundaries as in Lap2DMt
+#method -- time integration of GridIntegrator, forward Euler by default
+class RDStepper:
+    def __init__(self, shape, dx2, d, reaction, dt, dtype=float, method='euler'):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.d = np.asarray(d, dtype=self.dtype)
+        if self.d.shape != (self.shape[0],):
+            raise ValueError('need one diffusion coefficient per species')
+        self.reaction = reaction
+        self.dx2 = dx2
+        self.dt = dt
+        self.method = method
+        self.t = 0.
+
+        #Species with d != 0, as a slice when they are contiguous
+        idx = np.flatnonzero(self.d)
+        if len(idx) and np.all(np.diff(idx) == 1):
+            self._diffusing = slice(idx[0], idx[-1] + 1)
+        else:
+            self._diffusing = idx
+        self._idx = idx
+        self._sub = np.empty((len(idx),) + self.shape[1:], self.dtype)
+        self._lap = np.empty((len(idx),) + self.shape[1:], self.dtype)
+        self._stencil = discreteLaplacian.Lap2DStencil(self._lap.shape, dx2, self.dtype)
+        self._integrator = GridIntegrator(self.rhs, self.shape, dt, method, self.dtype)
+
+    #dU/dt into dUdt (in place)
+    def rhs(self, U, dUdt):
+        dUdt.fill(0.)
+        if len(self._idx):
+            if isinstance(self._diffusing, slice):
+                self._stencil(U[self._diffusing], out=self._lap)
+            else:
+                np.take(U, self._idx, axis=0, out=self._sub)
+                self._stencil(self._sub, out=self._lap)
+            for j, i in enumerate(self._idx):
+                np.multiply(self._lap[j], self.d[i], out=dUdt[i])
+        self.reaction(U, dUdt)
+        return dUdt
+
+    #Advance U by one time step, into Unext or in place
+    def step(self, U, Unext=None):
+        out = self._integrator.step(U, Unext)
+        self.t += self.dt
+        return out
+
+    def set_dt(self, dt):
+        self.dt = dt
+        self._integrator.dt = dt
+
+    #Reaction Jacobian of every cell by finite differences, shape (n, n, Ymax, Xmax)
+    #The reaction is local, so one perturbation per species covers all cells
+    def reaction_jacobian(self, U):
+        n = self.shape[0]
+        U = np.array(U, dtype=float)
+        R0 = np.zeros(U.shape)
+        self.reaction(U, R0)
+        J = np.empty((n, n) + self.shape[1:])
+        for j in range(n):
+            eps = 1e-7 * (1. + np.abs(U[j]).max())
+            Up = U.copy()
+            Up[j] += eps
+            Rp = np.zeros(U.shape)
+            self.reaction(Up, Rp)
+            J[:, j] = (Rp - R0) / eps
+        return J
+
+    #Largest stable dt for the current state
+    #Gershgorin bound of the spectral radius of diffusion + reaction Jacobian,
+    #cell by cell: |J_ii - 4 * d_i / dx2| + 4 * d_i / dx2 + sum_j!=i |J_ij|
+    def stable_dt(self, U, safety=0.9):
+        J = self.reaction_jacobian(U)
+        n = self.shape[0]
+        diag = J[np.arange(n), np.arange(n)]
+        offdiag = np.abs(J).sum(axis=1) - np.abs(diag)
+        dd = 4. * np.asarray(self.d, dtype=float)[:, None, None] / self.dx2
+        rho = (np.abs(diag - dd) + dd + offdiag).max()
+        if rho == 0.:
+            return np.inf
+        return safety * STABILITY[self.method] / rho
+
+    #Advance U (in place) to time t_end, re-selecting dt from stable_dt
+    #every adapt_every steps; the last step is shortened to land on t_end
+    #Raises FloatingPointError if the fields stop being finite
+    def advance(self, U, t_end, adapt_every=10, safety=0.9, dt_max=np.inf):
+        nsteps = 0
+        while self.t < t_end:
+            if nsteps % adapt_every == 0:
+                if not np.isfinite(U).all():
+                    raise FloatingPointError('non-finite values at t = {}'.format(self.t))
+                dt = min(self.stable_dt(U, safety), dt_max)
+            self.set_dt(min(dt, t_end - self.t))
+            self.step(U)
+            nsteps += 1
+        if not np.isfinite(U).all():
+            raise FloatingPointError('non-finite values at t = {}'.format(self.t))
+        return U, nsteps
+
+
+#IMEX (SBDF) stepper: diffusion implicit, reaction explicit
+#order=1 -- (I - dt * d * L) U[n+1] = U[n] + dt * R(U[n])
+#order=2 -- (3 - 2 * dt * d * L) U[n+1] = 4 * U[n] - U[n-1] + 2 * dt * (2 * R(U[n]) - R(U[n-1])),
+#started with one first-order step
+#solver='spectral' solves with the DCT that diagonalizes Lap2DMt,
+#solver='splu' with a sparse LU factorization cached per coefficient
+#Only the reaction limits dt (e.g. the FHN kinetics of 4_8B-D)
+class IMEXStepper:
+    def __init__(self, shape, dx2, d, reaction, dt, order=2, solver='spectral', dtype=float):
+        if order not in (1, 2):
+            raise ValueError('order must be 1 or 2')
+        if solver not in ('spectral', 'splu'):
+            raise ValueError('unknown solver: {}'.format(solver))
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.d = np.asarray(d, dtype=float)
+        if self.d.shape != (self.shape[0],):
+            raise ValueError('need one diffusion coefficient per species')
+        self.dx2, self.reaction, self.dt = dx2, reaction, dt
+        self.order, self.solver = order, solver
+        self.t = 0.
+        self.U_prev = None    #U and R at the previous step, for order 2
+        self.R_prev = None
+        self._R = np.zeros(self.shape, self.dtype)
+        self._rhs = np.empty(self.shape, self.dtype)
+        self._solvers = {}
+        if solver == 'spectral':
+            self._lam = discreteLaplacian.Lap2DEigenvalues(self.shape[1:], dx2)
+
+    #Solver of (I - g * L) x = b for one field, cached per g
+    def _solve(self, g, b, out):
+        if g not in self._solvers:
+            if self.solver == 'spectral':
+                self._solvers[g] = (1. / (1. - g * self._lam)).astype(self.dtype)
+            else:
+                n = b.size
+                A = sp.identity(n) - g * discreteLaplacian.Lap2DSparse(self.shape[1:], self.dx2)
+                self._solvers[g] = spla.splu(A.tocsc().astype(self.dtype))
+        if self.solver == 'spectral':
+            bh = scipy.fft.dctn(b, type=2, norm='ortho')
+            bh *= self._solvers[g]
+            out[...] = scipy.fft.idctn(bh, type=2, norm='ortho', overwrite_x=True)
+        else:
+            out[...] = self._solvers[g].solve(b.ravel()).reshape(b.shape)
+
+    #Advance U by one time step, into Unext or in place
+    def step(self, U, Unext=None):
+        dt, R, rhs = self.dt, self._R, self._rhs
+        R.fill(0.)
+        self.reaction(U, R)
+        if self.order == 1 or self.U_prev is None:
+            #rhs = U + dt * R, gamma = 1
+            np.multiply(R, dt, out=rhs)
+            rhs += U
+            gamma = 1.
+            if self.order == 2:
+                self.U_prev, self.R_prev = np.empty(self.shape, self.dtype), np.empty(self.shape, self.dtype)
+        else:
+            #rhs = (4 * U - U_prev) / 3 + 2 / 3 * dt * (2 * R - R_prev), gamma = 2 / 3
+            np.multiply(R, 2., out=rhs)
+            rhs -= self.R_prev
+            rhs *= 2. * dt
+            rhs += 4. * U
+            rhs -= self.U_prev
+            rhs /= 3.
+            gamma = 2. / 3.
+        if self.order == 2:
+            self.U_prev[...] = U
+            self.R_prev[...] = R
+        out = U if Unext is None else Unext
+        for i in range(self.shape[0]):
+            if self.d[i] == 0.:
+                out[i] = rhs[i]
+            else:
+                self._solve(gamma * dt * self.d[i], rhs[i], out[i])
+        self.t += dt
+        return out
+
+
+#Exact step of d/dt u = A * u + b over h: u -> E * u + P * b,
+#E = exp(A * h), P = (exp(A * h) - I) * A^-1 (taken from one augmented exponential)
+def _linear_propagator(A, h):
+    n = A.shape[0]
+    aug = np.zeros((2 * n, 2 * n))
+    aug[:n, :n] = A
+    aug[:n, n:] = np.eye(n)
+    expo = scipy.linalg.expm(aug * h)
+    return expo[:n, :n], expo[:n, n:]
+
+#Strang splitting for stacked fields
+#d/dt U = d * (Laplacian) * U + A * U + source + nonlinear(U)
+#A -- linear reaction matrix (n_species, n_species), or a list of matrices,
+#one per cell type, with cell_type the grid of type indices
+#source -- constant field (n_species, Ymax, Xmax) or None
+#nonlinear(U, dUdt) -- remaining terms, added in place like reaction in RDStepper
+#A step is diffusion(dt/2) linear(dt/2) nonlinear(dt) linear(dt/2) diffusion(dt/2):
+#diffusion and the linear kinetics are exact (DCT and matrix exponential),
+#the nonlinear part uses Heun's method, so the whole step is second order
+class StrangSplitting:
+    def __init__(self, shape, dx2, d, A, dt, source=None, nonlinear=None, cell_type=None, dtype=float):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.d = np.asarray(d, dtype=float)
+        if self.d.shape != (self.shape[0],):
+            raise ValueError('need one diffusion coefficient per species')
+        self.dt = dt
+        self.t = 0.
+        self.source = None if source is None else np.asarray(source, dtype=self.dtype)
+        self._diffusion = [discreteLaplacian.SpectralDiffusion(self.shape[1:], dx2, di) if di != 0. else None
+                           for di in self.d]
+
+        if cell_type is None:
+            As = [np.asarray(A, dtype=float)]
+            self._masks = [None]
+        else:
+            As = [np.asarray(Ai, dtype=float) for Ai in A]
+            self._masks = [cell_type == i for i in range(len(As))]
+        self._props = [tuple(M.astype(self.dtype) for M in _linear_propagator(Ai, 0.5 * dt)) for Ai in As]
+
+        self.nonlinear = nonlinear
+        self._nonlinear = None
+        if nonlinear is not None:
+            self._nonlinear = GridIntegrator(self._nonlinear_rhs, self.shape, dt, 'heun', self.dtype)
+
+    def _nonlinear_rhs(self, U, dUdt):
+        dUdt.fill(0.)
+        self.nonlinear(U, dUdt)
+
+    def _diffuse(self, U):
+        for i, diff in enumerate(self._diffusion):
+            if diff is not None:
+                diff.advance(U[i], 0.5 * self.dt, out=U[i])
+
+    def _linear(self, U):
+        for (E, P), mask in zip(self._props, self._masks):
+            u = U if mask is None else U[:, mask]
+            new = np.tensordot(E, u, axes=1)
+            if self.source is not None:
+                b = self.source if mask is None else self.source[:, mask]
+                new += np.tensordot(P, b, axes=1)
+            if mask is None:
+                U[...] = new
+            else:
+                U[:, mask] = new
+
+    #Advance U by one time step, into Unext or in place
+    def step(self, U, Unext=None):
+        if Unext is not None:
+            Unext[...] = U
+            U = Unext
+        self._diffuse(U)
+        self._linear(U)
+        if self._nonlinear is not None:
+            self._nonlinear.step(U)
+        self._linear(U)
+        self._diffuse(U)
+        self.t += self.dt
+        return U
+
+
+#ETDRK4 coefficients of the diagonal linear operator lin = d * eigenvalues(Lap2DMt) - k
+#for one species, by contour integration over M points around each h * lin
+#(Kassam and Trefethen); cached per (shape, dx2, d, k, dt)
+@functools.lru_cache(maxsize=32)
+def _etdrk4_coefficients(shape, dx2, d, k, dt, M=32):
+    lin = d * discreteLaplacian.Lap2DEigenvalues(shape, dx2) - k
+    E, E2 = np.exp(dt * lin), np.exp(0.5 * dt * lin)
+    r = np.exp(1j * np.pi * (np.arange(1, M + 1) - 0.5) / M)
+    LR = dt * lin[..., None] + r
+    eLR = np.exp(LR)
+    Q = dt * np.real(np.mean((np.exp(0.5 * LR) - 1.) / LR, axis=-1))
+    f1 = dt * np.real(np.mean((-4. - LR + eLR * (4. - 3. * LR + LR**2)) / LR**3, axis=-1))
+    f2 = dt * np.real(np.mean((2. + LR + eLR * (-2. + LR)) / LR**3, axis=-1))
+    f3 = dt * np.real(np.mean((-4. - 3. * LR - LR**2 + eLR * (4. - LR)) / LR**3, axis=-1))
+    return E, E2, Q, f1, f2, f3
+
+def _dct(U):
+    return scipy.fft.dctn(U, type=2, norm='ortho', axes=(-2, -1))
+
+def _idct(Uh):
+    return scipy.fft.idctn(Uh, type=2, norm='ortho', axes=(-2, -1))
+
+#ETDRK4 exponential integrator (Cox and Matthews) for stacked fields
+#d/dt U = d * (Laplacian) * U - k * U + nonlinear(U)
+#The linear part is diagonal in the DCT basis of Lap2DMt and is integrated
+#exactly; nonlinear(U, dUdt) adds the remaining terms in place, like reaction
+#in RDStepper (e.g. the Turing kinetics of 4_7A-D or the FHN terms of 4_8B)
+class ETDRK4Stepper:
+    def __init__(self, shape, dx2, d, nonlinear, dt, k=0., dtype=float):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        n = self.shape[0]
+        self.d = np.asarray(d, dtype=float)
+        self.k = np.broadcast_to(np.asarray(k, dtype=float), (n,))
+        if self.d.shape != (n,):
+            raise ValueError('need one diffusion coefficient per species')
+        self.nonlinear, self.dt = nonlinear, dt
+        self.t = 0.
+        coef = [_etdrk4_coefficients(self.shape[1:], dx2, float(di), float(ki), dt)
+                for di, ki in zip(self.d, self.k)]
+        self.E, self.E2, self.Q, self.f1, self.f2, self.f3 = (np.stack(c).astype(self.dtype) for c in zip(*coef))
+        self._N = np.empty(self.shape, self.dtype)
+
+    #DCT of nonlinear(U)
+    def _Nh(self, U):
+        self._N.fill(0.)
+        self.nonlinear(U, self._N)
+        return _dct(self._N)
+
+    #Advance U by one time step, into Unext or in place
+    def step(self, U, Unext=None):
+        v = _dct(U)
+        Nv = self._Nh(U)
+        a = self.E2 * v + self.Q * Nv
+        Na = self._Nh(_idct(a))
+        b = self.E2 * v + self.Q * Na
+        Nb = self._Nh(_idct(b))
+        c = self.E2 * a + self.Q * (2. * Nb - Nv)
+        Nc = self._Nh(_idct(c))
+        v = self.E * v + Nv * self.f1 + 2. * (Na + Nb) * self.f2 + Nc * self.f3
+        out = U if Unext is None else Unext
+        out[...] = _idct(v)
+        self.t += self.dt
+        return out
+
+
+#Method of lines with the species of each cell side by side (cell-major order),
+#y[n * (Xmax * y + x) + i] = U[i, y, x] for stacked fields U of shape (n, Ymax, Xmax)
+#The Laplacian then only couples entries n * Xmax apart at most, so the Jacobian
+#is banded with ml = mu = n * Xmax instead of (n - 1) * Ymax * Xmax + Xmax
+def to_cell_major(U):
+    return np.moveaxis(U, 0, -1).ravel()
+
+def from_cell_major(y, shape):
+    return np.moveaxis(np.reshape(y, tuple(shape[1:]) + (shape[0],)), -1, 0)
+
+
+#Sparse Jacobian of the cell-major system
+#d/dt U[i] = d[i] * (Laplacian) * U[i] + R_i(U), boundaries as in Lap2DMt
+#d -- one coefficient per species, each a scalar or a (Ymax, Xmax) grid
+#(d * (Laplacian) * V, or div(d * grad V) with conservative=True as in 4_8C,
+#see discreteLaplacian.DivGrad2DSparse); 0 for species that do not diffuse
+#J(R) -- reaction Jacobian dR_i/dU_j per cell, shape (n, n, Ymax, Xmax)
+#as from RDStepper.reaction_jacobian
+#.sparsity -- jac_sparsity for solve_ivp (BDF, Radau)
+#.banded(R) -- packed bands for odeint(..., Dfun, ml=.ml, mu=.mu)
+class MOLJacobian:
+    def __init__(self, shape, dx2, d, conservative=False):
+        self.shape = tuple(shape)
+        n = self.shape[0]
+        if len(d) != n:
+            raise ValueError('need one diffusion coefficient per species')
+        self.ml = self.mu = n * self.shape[2]
+        L = discreteLaplacian.Lap2DSparse(self.shape[1:], dx2)
+        #Species i of every cell: rows and columns i, i + n, i + 2n, ...
+        self._diffusion = sp.csr_matrix((L.shape[0] * n,) * 2)
+        for i, di in enumerate(d):
+            if np.any(di):
+                Ei = sp.csr_matrix(([1.], ([i], [i])), shape=(n, n))
+                di = np.broadcast_to(di, self.shape[1:])
+                Li = discreteLaplacian.DivGrad2DSparse(di, dx2) if conservative else sp.diags(di.ravel()) @ L
+                self._diffusion = self._diffusion + sp.kron(Li, Ei)
+        self._diffusion = self._diffusion.tocsr()
+        self._diffusion.eliminate_zeros()    #rows of cells with d = 0
+        #Nonzeros of the diffusion part and of the per-cell blocks only
+        self.sparsity = (self._diffusion.astype(bool) + self._blocks(np.ones((n, n) + self.shape[1:])).astype(bool)).tocsr()
+
+    #Block diagonal of the per-cell reaction Jacobians
+    def _blocks(self, J):
+        n, N = self.shape[0], self.shape[1] * self.shape[2]
+        blocks = np.moveaxis(np.reshape(J, (n, n, N)), -1, 0)
+        return sp.bsr_matrix((blocks, np.arange(N), np.arange(N + 1)), shape=(n * N, n * N))
+
+    def __call__(self, J):
+        return (self._diffusion + self._blocks(J)).tocsr()
+
+    #jac[i - j + mu, j] = dy_i / dy_j, the band storage of odeint with ml, mu
+    def banded(self, J):
+        M = self(J).tocoo()
+        jac = np.zeros((self.ml + self.mu + 1, M.shape[1]))
+        jac[M.row - M.col + self.mu, M.col] = M.data
+        return jac
+
+
+#Time stepping that keeps only the current and the next state in memory
+#step(U, Unext) -- advances the stacked fields U by one time step into Unext
+#recorder(T, t, U) -- receives every STEP-th state (T = 0, STEP, 2 * STEP, ...);
+#U is a work buffer, so the recorder must copy what it keeps
+#Returns the state at step Tmax - 1, like the last frame of a (Y, X, Tmax) history
+def run_streaming(step, U0, Tmax, dt, recorder=None, STEP=1):
+    return _stream(step, U0, Tmax, dt, recorder, STEP, None, 1)[0]
+
+#As run_streaming, but stops early once the fields have settled: every
+#check_every steps the residual max|U[T] - U[T - 1]| / dt is compared with tol
+#The settled state is also handed to the recorder
+#Returns U, the step T and time t of convergence (None, None if Tmax was reached)
+#and the last residual
+def run_until_steady(step, U0, Tmax, dt, tol, check_every=10, recorder=None, STEP=1):
+    return _stream(step, U0, Tmax, dt, recorder, STEP, tol, check_every)
+
+#As run_streaming, with a checkpoint (see checkpoint.save) written to path every
+#`every` steps; if path exists, the run resumes from it and continues bit for bit.
+#step must depend on U (and rng) only, e.g. FHNStepper or RDStepper with Euler.
+#rng -- random generator used by step, its state is saved with the fields
+#params -- dict of the model parameters step was built with (scalars or arrays,
+#e.g. the stimulus I and conductivity d); they are kept with the checkpoint
+#together with U0, Tmax and STEP, and one from a run with other values is refused
+#The checkpoint is removed once Tmax is reached
+def run_checkpointed(step, U0, Tmax, dt, path, every=1000, recorder=None, STEP=1, rng=None, params=None):
+    params = params or {}
+    run = {'U0': np.asarray(U0), 'Tmax': Tmax, 'STEP': STEP, 'params': np.array(sorted(params), dtype=str)}
+    run.update({'param_' + key: value for key, value in params.items()})
+    T0 = 0
+    if os.path.exists(path):
+        saved = checkpoint.load(path, recorder, rng, expect=dict(run, dt=dt))
+        U0, T0 = saved['U'], saved['T']
+
+    def save(T, U):
+        checkpoint.save(path, U, T, T * dt, dt, recorder, rng, **run)
+
+    U = _stream(step, U0, Tmax, dt, recorder, STEP, None, 1, T0, save, every)[0]
+    if os.path.exists(path):
+        os.remove(path)
+    return U
+
+def _stream(step, U0, Tmax, dt, recorder, STEP, tol, check_every, T0=0, save=None, every=None):
+    U = np.array(U0, copy=True)
+    Unext = np.empty_like(U)
+    residual = None
+    for T in range(T0, Tmax):
+        if save is not None and T > T0 and T % every == 0:
+            save(T, U)
+        if recorder is not None and T % STEP == 0:
+            recorder(T, T * dt, U)
+        if T == Tmax - 1:
+            break
+        step(U, Unext)
+        if tol is not None and (T + 1) % check_every == 0:
+            np.subtract(Unext, U, out=U)
+            residual = np.abs(U).max() / dt
+            if residual < tol:
+                if recorder is not None:
+                    recorder(T + 1, (T + 1) * dt, Unext)
+                return Unext, T + 1, (T + 1) * dt, residual
+        U, Unext = Unext, U
+    return U, None, None, residual
@@ -0,0 +1,93 @@
+"""
+Equivalence check of the vectorized discreteLaplacian.Lap2D
+against the original cell-by-cell loop, and of the stencil behind
+discreteLaplacian.Lap2DMt against the original shifted copies, on random grids
+"""
+import numpy as np
+import time
+import discreteLaplacian
+
+#Original loop version of Lap2D
+def Lap2D_loop(U, dx):
+    Xmax, Ymax = U.shape
+    L = np.zeros(U.shape)
+
+    # Do not calc. at the boundaries
+    for X in range(1, Xmax - 2):
+        for Y in range(1, Ymax - 2):
+            L[Y, X] = (U[Y, X - 1] + U[Y, X + 1] + U[Y - 1, X] + U[Y + 1, X] - 4 * U[Y, X]) / dx / dx
+
+    # Calc. at the horizontal boundaries
+    for X in range(1, Xmax - 2):
+        Y = 0
+        L[Y, X] = (U[Y, X - 1] + U[Y, X + 1] + U[Y + 1, X] - 3 * U[Y, X]) / dx / dx
+        Y = Ymax - 1
+        L[Y, X] = (U[Y, X - 1] + U[Y, X + 1] + U[Y - 1, X] - 3 * U[Y, X]) / dx / dx
+
+    # Calc. at the vertical boundaries
+    for Y in range(1, Ymax - 2):
+        X = 0
+        L[Y, X] = (U[Y, X + 1] + U[Y - 1, X] + U[Y + 1, X] - 3 * U[Y, X]) / dx / dx
+        X = Xmax - 1
+        L[Y, X] = (U[Y, X - 1] + U[Y - 1, X] + U[Y + 1, X] - 3 * U[Y, X]) / dx / dx
+
+    # Calc. at the corners
+    X, Y = 0, 0
+    L[Y, X] = (U[Y, X + 1] + U[Y + 1, X] - 2 * U[Y, X]) / dx / dx
+
+    X, Y = 0, Ymax - 1
+    L[Y, X] = (U[Y, X + 1] + U[Y - 1, X] - 2 * U[Y, X]) / dx / dx
+
+    X, Y = Xmax - 1, 0
+    L[Y, X] = (U[Y, X - 1] + U[Y + 1, X] - 2 * U[Y, X]) / dx / dx
+
+    X, Y = Xmax - 1, Ymax - 1
+    L[Y, X] = (U[Y, X - 1] + U[Y - 1, X] - 2 * U[Y, X]) / dx / dx
+
+    return L / 4.
+
+#Original shifted-copy version of Lap2DMt
+def Lap2DMt_copies(Et, dx2):
+    Ymax, Xmax = Et.shape
+
+    Er = np.zeros(Et.shape)
+    El = np.zeros(Et.shape)
+    Eu = np.zeros(Et.shape)
+    Ed = np.zeros(Et.shape)
+
+    Er[:, Xmax - 1] = Et[:, Xmax - 1]
+    Er[:, :Xmax - 1] = Et[:, 1:]
+
+    El[:, 0] = Et[:, 0]
+    El[:, 1:] = Et[:, :Xmax - 1]
+
+    Ed[Ymax - 1, :] = Et[Ymax - 1, :]
+    Ed[:Ymax - 1, :] = Et[1:, :]
+
+    Eu[0, :] = Et[0, :]
+    Eu[1:, :] = Et[:Ymax - 1, :]
+
+    return (Er + El + Eu + Ed - 4. * Et) / dx2
+
+#Compare results on random square grids
+rng = np.random.default_rng(0)
+for Xmax in [2, 3, 4, 5, 10, 37, 100]:
+    for dx in [1., 0.5, 0.1]:
+        U = rng.random((Xmax, Xmax))
+        if not np.array_equal(discreteLaplacian.Lap2D(U, dx), Lap2D_loop(U, dx)):
+            raise AssertionError('Lap2D differs from the loop version (Xmax = {}, dx = {})'.format(Xmax, dx))
+print('Lap2D matches the loop version')
+
+#Lap2DMt on random rectangular grids; dx2 as float, 0-d array, float32 and per cell
+for Ymax, Xmax in [(2, 3), (10, 10), (37, 23)]:
+    E = rng.random((Ymax, Xmax))
+    for dx2 in [1., 0.25, np.array(0.01), np.float32(0.3), rng.random((Ymax, Xmax)) + 0.5, rng.random(Xmax) + 0.5]:
+        if not np.array_equal(discreteLaplacian.Lap2DMt(E, dx2), Lap2DMt_copies(E, dx2)):
+            raise AssertionError('Lap2DMt differs from the shifted-copy version (shape = {}, dx2 = {})'.format(E.shape, dx2))
+print('Lap2DMt matches the shifted-copy version')
+
+#Timing
+U = rng.random((1000, 1000))
+starttime = time.time()
+discreteLaplacian.Lap2D(U, 1.)
+print('Lap2D on 1000x1000 (sec): {}'.format(time.time() - starttime))
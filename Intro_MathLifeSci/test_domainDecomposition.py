@@ -0,0 +1,61 @@
+"""
+Equivalence check of domainDecomposition.TiledRunner against
+forward Euler with discreteLaplacian.Lap2DMt, and of the error path
+when a strip worker is killed
+"""
+import numpy as np
+import os
+import signal
+import time
+import discreteLaplacian
+import domainDecomposition
+
+#FHN reaction of 4_8B, with the stimulus on the rows of the strip
+I = np.zeros((37, 23))
+I[17:19, 10:12] = 1.
+a, b, c = 0.7, 0.8, 10.
+
+def reaction(U, dUdt, rows):
+    V, W = U
+    dUdt[0] += c * (-V**3 / 3. + V - W + I[rows])
+    dUdt[1] += (V - b * W + a) / c
+
+#The first strip is killed by a signal after 50 steps, so its except clause never runs
+calls = 0
+def killed_reaction(U, dUdt, rows):
+    global calls
+    calls += 1
+    if rows.start == 0 and calls > 50:
+        os.kill(os.getpid(), signal.SIGKILL)
+    reaction(U, dUdt, rows)
+
+if __name__ == '__main__':
+    dt, dx2, d, nsteps = 0.02, 1., np.array([1., 0.]), 200
+    rng = np.random.default_rng(0)
+    U0 = rng.random((2,) + I.shape)
+
+    #Reference: forward Euler with Lap2DMt, terms summed in the order of the workers
+    V, W = U0.copy()
+    for T in range(nsteps):
+        dV = d[0] * discreteLaplacian.Lap2DMt(V, dx2)
+        dV += c * (-V**3 / 3. + V - W + I)
+        dW = d[1] * discreteLaplacian.Lap2DMt(W, dx2)
+        dW += (V - b * W + a) / c
+        V, W = V + dV * dt, W + dW * dt
+
+    for nworkers in [1, 2, 4, 7]:
+        U = U0.copy()
+        domainDecomposition.TiledRunner(U.shape, dx2, d, reaction, dt, nworkers).run(U, nsteps)
+        err = max(np.abs(U[0] - V).max(), np.abs(U[1] - W).max())
+        if err != 0.:
+            raise AssertionError('TiledRunner differs from Lap2DMt Euler by {} ({} workers)'.format(err, nworkers))
+    print('TiledRunner matches Lap2DMt forward Euler')
+
+    #A killed worker must make run() raise instead of hanging at the barrier
+    starttime = time.time()
+    try:
+        domainDecomposition.TiledRunner(U0.shape, dx2, d, killed_reaction, dt, 4).run(U0.copy(), 10**7)
+    except RuntimeError as e:
+        print('Killed worker reported after {:.1f} sec: {}'.format(time.time() - starttime, e))
+    else:
+        raise AssertionError('TiledRunner did not report the killed worker')
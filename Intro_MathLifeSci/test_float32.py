@@ -0,0 +1,74 @@
+"""
+Accuracy of float32 grid simulations against float64
+FHN heart tissue of 4_8B, stepped with fastKernels.FHNStepper
+
+Reports the largest deviation of V over the run, the activation times
+at two probe cells (time V first exceeds 1) and the wave speed between them,
+then compares the float32 runs of the numba and numpy backends
+"""
+import numpy as np
+import time
+import fastKernels
+
+#Initialize params (as in 4_8B)
+Tmax, dt = 5000, 0.02
+Xmax, dx = 100, 1.
+dx2 = dx*dx
+d, a, b, c = 1., 0.7, 0.8, 10.
+probes = [(50, 70), (50, 90)]   #cells right of the stimulus
+
+#One run of the given precision; step() advances it by dt and returns the time spent
+class Run:
+    def __init__(self, dtype, backend):
+        I = np.zeros((Xmax, Xmax), dtype)
+        I[49:51, 49:51] = 1.
+        self.stepper = fastKernels.FHNStepper((Xmax, Xmax), dx2, d, a, b, c, I, dt, backend=backend, dtype=dtype)
+        self.V, self.W = np.zeros((Xmax, Xmax), dtype), np.zeros((Xmax, Xmax), dtype)
+        self.V1, self.W1 = np.empty_like(self.V), np.empty_like(self.W)
+        self.t_act = [None for _ in probes]
+
+    def step(self, T):
+        for i, (y, x) in enumerate(probes):
+            if self.t_act[i] is None and self.V[y, x] > 1.:
+                self.t_act[i] = dt * T
+        starttime = time.time()
+        self.stepper.step(self.V, self.W, self.V1, self.W1)
+        self.V, self.V1, self.W, self.W1 = self.V1, self.V, self.W1, self.W
+        return time.time() - starttime
+
+#Steps two runs side by side, so only the current frames are held;
+#returns max|V1 - V2| over the run and the time spent in each
+def compare(r1, r2):
+    e1 = e2 = diff = 0.
+    for T in range(Tmax):
+        diff = max(diff, float(np.abs(r1.V.astype(float) - r2.V).max()))
+        e1 += r1.step(T)
+        e2 += r2.step(T)
+    for r in (r1, r2):
+        if r.V.dtype != r.stepper.dtype:
+            raise AssertionError('state was upcast to {}'.format(r.V.dtype))
+    return diff, e1, e2
+
+backends = ['numpy', 'numba'] if fastKernels.HAVE_NUMBA else ['numpy']
+diffs = {}
+for backend in backends:
+    r64, r32 = Run(np.float64, backend), Run(np.float32, backend)
+    diff, e64, e32 = compare(r64, r32)
+    t64, t32 = r64.t_act, r32.t_act
+    diffs[backend] = diff
+    dist = abs(probes[1][1] - probes[0][1]) * dx
+    print('backend: {}'.format(backend))
+    print('  max|V32 - V64| over the run: {:.3e}'.format(diff))
+    print('  activation times float64: {}, float32: {}'.format(t64, t32))
+    print('  wave speed float64: {:.4f}, float32: {:.4f}'.format(dist / (t64[1] - t64[0]), dist / (t32[1] - t32[0])))
+    print('  time elapsed (sec) float64: {:.2f}, float32: {:.2f}'.format(e64, e32))
+
+#The compiled float32 step must round like the NumPy one: a float64 constant
+#in the kernel would make it compute in double precision and drift towards V64
+if fastKernels.HAVE_NUMBA:
+    rnp, rnb = Run(np.float32, 'numpy'), Run(np.float32, 'numba')
+    diff, _, _ = compare(rnp, rnb)
+    print('float32 numba against numpy')
+    print('  max|V32 numba - V32 numpy| over the run: {:.3e}'.format(diff))
+    if diff > diffs['numpy']:
+        raise AssertionError('float32 backends differ more than float32 from float64')
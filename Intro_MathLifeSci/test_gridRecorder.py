@@ -0,0 +1,39 @@
+"""
+Read-back check of gridRecorder.DiskRecorder / SnapshotStore
+against the same snapshots kept in memory, for forward, reversed
+and list indices across chunk boundaries
+"""
+import numpy as np
+import shutil
+import tempfile
+import gridRecorder
+
+#Record 10 frames of two random fields in chunks of 4
+rng = np.random.default_rng(0)
+shape = (5, 6)
+path = tempfile.mkdtemp()
+ref = gridRecorder.MemoryRecorder()
+try:
+    with gridRecorder.DiskRecorder(path, ['V', 'W'], shape, chunk=4) as rec:
+        for T in range(10):
+            U = rng.random((2,) + shape)
+            rec(T, 0.1 * T, U)
+            ref(T, 0.1 * T, U)
+    store = gridRecorder.SnapshotStore(path)
+    frames = ref.frames
+
+    keys = [3, -1, slice(None), slice(2, 9), slice(None, None, -1), slice(8, 1, -3),
+            [7, 1, 5], [9, 0, 9], np.array([2, 6, 3]), (slice(None, None, -1), 0, 0),
+            ([7, 1, 5], slice(1, 3), 2), (slice(4, 4), 0)]
+    for key in keys:
+        full = key if isinstance(key, tuple) else (key,)
+        for i, name in enumerate(['V', 'W']):
+            expected = frames[:, i][full]
+            got = store[name][key]
+            if got.shape != expected.shape or not np.array_equal(got, expected):
+                raise AssertionError('store[{!r}][{!r}] differs from the in-memory frames'.format(name, key))
+        if not np.array_equal(store.steps[full[0]], np.array(ref.steps)[full[0]]):
+            raise AssertionError('steps[{!r}] differs'.format(full[0]))
+    print('SnapshotStore matches the in-memory frames')
+finally:
+    shutil.rmtree(path)